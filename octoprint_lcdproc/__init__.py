@@ -1,17 +1,217 @@
 # coding=utf-8
 from __future__ import absolute_import
+from collections import namedtuple
+from dataclasses import replace
 from datetime import datetime, timedelta
+from types import MappingProxyType
+import os
+import threading
+import time
 
 import octoprint.plugin
-from octoprint.printer import PrinterInterface
+from octoprint.printer import PrinterInterface, PrinterCallback
 from octoprint.events import Events
-from octoprint.util import RepeatedTimer, ResettableTimer, get_formatted_datetime, get_formatted_timedelta
+from octoprint.util import get_formatted_datetime, get_formatted_timedelta
 
 from octoprint_lcdproc.lcdproc.server import Server
+from octoprint_lcdproc.keypad import Keypad, ACTION_SCREEN_NEXT, ACTION_SCREEN_PREV, ACTION_ACKNOWLEDGE, ACTION_PAUSE
+from octoprint_lcdproc.connection import ConnectionManager
+from octoprint_lcdproc.console import ConsoleTail
+from octoprint_lcdproc.estimator import DurationStore, EtaEstimator
+from octoprint_lcdproc.history import PrintHistory, HISTORY_DONE, HISTORY_FAILED, HISTORY_CANCELLED
+from octoprint_lcdproc.metadata import MetadataCache
+from octoprint_lcdproc.names import abbreviate_filename, strip_filename
+from octoprint_lcdproc.notifications import Notifications, NOTIFY_INFO, NOTIFY_MESSAGE, NOTIFY_ALERT
+from octoprint_lcdproc.alerts import AlertDetector, ALERT_PATTERNS
+from octoprint_lcdproc.backlight import Backlight, BACKLIGHT_STATES, BACKLIGHT_PRINTING, BACKLIGHT_PAUSED, BACKLIGHT_FAILED, BACKLIGHT_DONE, BACKLIGHT_IDLE, BACKLIGHT_CONNECTED, BACKLIGHT_DISCONNECTED
+from octoprint_lcdproc.outputs import Outputs, OUTPUT_STATES, OUTPUT_PRINTING, OUTPUT_PAUSED, OUTPUT_ERROR, OUTPUT_DONE, OUTPUT_HEATING
+from octoprint_lcdproc.scheduler import Scheduler
+from octoprint_lcdproc.tracker import GcodeTracker, JobTotalsCache
+from octoprint_lcdproc.worker import DisplayWorker
+from octoprint_lcdproc.state import DisplayState, STATE_NON_PRINTING, STATE_PRINTING, STATE_IDLE, STATE_PAUSED, STATE_ERROR, PrintResult
 
-STATE_NON_PRINTING = "non_printing"
-STATE_PRINTING = "printing"
-STATE_IDLE = "idle"
+# items the display worker renders, in this order
+RENDER_RECONNECT = "reconnect"
+RENDER_CONNECT = "connect"
+RENDER_STATE = "state"
+RENDER_PRIORITY = "priority"
+RENDER_OUTPUTS = "outputs"
+RENDER_BACKLIGHT = "backlight"
+RENDER_LAYOUT = "layout"
+RENDER_KEYPAD = "keypad"
+RENDER_OUTPUTS_CONFIG = "outputs_config"
+RENDER_BACKLIGHT_CONFIG = "backlight_config"
+RENDER_HEALTH = "health"
+RENDER_HEALTH_CONFIG = "health_config"
+RENDER_PAGES = "pages"
+RENDER_ALERTS_CONFIG = "alerts_config"
+RENDER_ORDER = [ RENDER_RECONNECT, RENDER_CONNECT, RENDER_STATE, RENDER_LAYOUT, RENDER_KEYPAD, RENDER_OUTPUTS_CONFIG, RENDER_BACKLIGHT_CONFIG, RENDER_HEALTH_CONFIG, RENDER_HEALTH, RENDER_PAGES, RENDER_ALERTS_CONFIG, RENDER_PRIORITY, 'TitleText', 'TextFileName', 'TextPercent', 'TextETA', 'TextFIN', 'TextMessage', 'TextLayer', 'TextFilament', 'TextConsole', 'TextMetadata', 'TextHistory', 'TextResult', RENDER_OUTPUTS, RENDER_BACKLIGHT, ]
+
+# what has to be redrawn when the display state changes: an item is rendered
+# when its key differs between the last rendered and the current snapshot.
+# A changing ETA is redrawn by the ETA timer, only its (dis)appearance counts.
+STATE_RENDER_KEYS = [
+    ( RENDER_PRIORITY, lambda state: ( state.priority_state, state.alert ) ),
+    ( 'TextFileName', lambda state: ( state.filename, not state.message ) ),
+    ( 'TextPercent', lambda state: state.percent ),
+    ( 'TextETA', lambda state: ( state.status, state.eta is None ) ),
+    ( 'TextFIN', lambda state: ( state.status, state.eta is None ) ),
+    ( 'TextMessage', lambda state: state.message ),
+    ( 'TextLayer', lambda state: ( state.layer, state.layers ) ),
+    ( 'TextFilament', lambda state: ( state.filament, state.filament_total ) ),
+    ( 'TextMetadata', lambda state: state.metadata ),
+    ( 'TextResult', lambda state: ( state.result, state.result_priority ) ),
+]
+
+# what has to be done when a setting changes, settings not listed here are
+# read when they are needed
+SETTINGS_RENDER = {
+    "enabled": RENDER_RECONNECT,
+    "host": RENDER_RECONNECT,
+    "port": RENDER_RECONNECT,
+    "hide_page_when_idle": RENDER_PRIORITY,
+    "priority_printing": RENDER_PRIORITY,
+    "priority_non_printing": RENDER_PRIORITY,
+    "priority_paused": RENDER_PRIORITY,
+    "priority_error": RENDER_PRIORITY,
+    "title_show": RENDER_LAYOUT,
+    "title_text": 'TitleText',
+    "filename_scroll": 'TextFileName',
+    "keys_enabled": RENDER_KEYPAD,
+    "key_screen_prev": RENDER_KEYPAD,
+    "key_screen_next": RENDER_KEYPAD,
+    "key_acknowledge": RENDER_KEYPAD,
+    "key_pause": RENDER_KEYPAD,
+    "key_long_press_ms": RENDER_KEYPAD,
+    "outputs_enabled": RENDER_OUTPUTS_CONFIG,
+    "output_printing": RENDER_OUTPUTS_CONFIG,
+    "output_paused": RENDER_OUTPUTS_CONFIG,
+    "output_error": RENDER_OUTPUTS_CONFIG,
+    "output_done": RENDER_OUTPUTS_CONFIG,
+    "output_heating": RENDER_OUTPUTS_CONFIG,
+    "backlight_enabled": RENDER_BACKLIGHT_CONFIG,
+    "backlight_printing": RENDER_BACKLIGHT_CONFIG,
+    "backlight_paused": RENDER_BACKLIGHT_CONFIG,
+    "backlight_failed": RENDER_BACKLIGHT_CONFIG,
+    "backlight_done": RENDER_BACKLIGHT_CONFIG,
+    "backlight_idle": RENDER_BACKLIGHT_CONFIG,
+    "backlight_connected": RENDER_BACKLIGHT_CONFIG,
+    "backlight_disconnected": RENDER_BACKLIGHT_CONFIG,
+    "backlight_alert": RENDER_BACKLIGHT_CONFIG,
+    "backlight_key_seconds": RENDER_BACKLIGHT_CONFIG,
+    "health_check_enabled": RENDER_HEALTH_CONFIG,
+    "health_check_interval_seconds": RENDER_HEALTH_CONFIG,
+    "job_screen_enabled": RENDER_PAGES,
+    "console_screen_enabled": RENDER_PAGES,
+    "metadata_screen_enabled": RENDER_PAGES,
+    "filament_density": 'TextMetadata',
+    "history_screen_enabled": RENDER_PAGES,
+    "alerts_enabled": RENDER_ALERTS_CONFIG,
+    "alert_patterns": RENDER_ALERTS_CONFIG,
+}
+
+# line of the main screen widgets, relative to the first line below the title
+MAIN_SCREEN_LINES = {
+    'TextPercent': 0,
+    'TextFileName': 0,
+    'TextETA': 1,
+    'TextFIN': 1,
+    'IconETA': 1,
+    'IconFIN': 1,
+    'TextMessage': 2,
+}
+
+# ETA refresh: interval while the ETA is unknown, at most this many minutes
+# skipped (one per remaining hour), margin after the minute boundary
+ETA_UNKNOWN_INTERVAL = 30.0
+ETA_MAX_SKIPPED_MINUTES = 4
+ETA_MARGIN = 0.5
+
+# seconds to wait for connecting to LCDd and for each reply
+LCDD_TIMEOUT = 5.0
+
+# upper limit of LCDd updates per second
+MAX_FRAME_RATE = 10.0
+
+# screens which can be selected with the keypad, in order
+SCREEN_PAGES = [ 'OctPriSCR1', 'OctPriJOB', 'OctPriMETA', 'OctPriHIST', 'OctPriCON', ]
+
+# optional screens -> the setting enabling them
+OPTIONAL_PAGES = {
+    'OctPriJOB': "job_screen_enabled",
+    'OctPriMETA': "metadata_screen_enabled",
+    'OctPriHIST': "history_screen_enabled",
+    'OctPriCON': "console_screen_enabled",
+}
+
+# result of a finished print in the history, and how it is shown
+HISTORY_RESULTS = {
+    Events.PRINT_DONE: HISTORY_DONE,
+    Events.PRINT_FAILED: HISTORY_FAILED,
+    Events.PRINT_CANCELLED: HISTORY_CANCELLED,
+}
+HISTORY_MARKS = {
+    HISTORY_DONE: "OK",
+    HISTORY_FAILED: "ERR",
+    HISTORY_CANCELLED: "CXL",
+}
+
+# result screen text per event, the other ends of a print show none
+RESULT_TEXTS = {
+    Events.PRINT_DONE: "DONE",
+    Events.PRINT_FAILED: "FAILED",
+}
+
+# notifications queued at most
+NOTIFICATION_LIMIT = 8
+
+# received lines kept for the console screen, and the minimum seconds
+# between two redraws of it
+CONSOLE_LINES = 8
+CONSOLE_REDRAW_INTERVAL = 1.0
+
+# event -> ( outputs switched on, outputs switched off )
+OUTPUT_EVENTS = {
+    Events.PRINT_STARTED: ( [ OUTPUT_PRINTING, ], [ OUTPUT_PAUSED, OUTPUT_ERROR, OUTPUT_DONE, ] ),
+    Events.PRINT_PAUSED: ( [ OUTPUT_PAUSED, ], [ OUTPUT_PRINTING, ] ),
+    Events.PRINT_RESUMED: ( [ OUTPUT_PRINTING, ], [ OUTPUT_PAUSED, ] ),
+    Events.PRINT_DONE: ( [ OUTPUT_DONE, ], [ OUTPUT_PRINTING, OUTPUT_PAUSED, ] ),
+    Events.PRINT_FAILED: ( [ OUTPUT_ERROR, ], [ OUTPUT_PRINTING, OUTPUT_PAUSED, ] ),
+    Events.PRINT_CANCELLED: ( [], [ OUTPUT_PRINTING, OUTPUT_PAUSED, ] ),
+    Events.ERROR: ( [ OUTPUT_ERROR, ], [] ),
+    Events.DISCONNECTED: ( [], [ OUTPUT_PRINTING, OUTPUT_PAUSED, OUTPUT_HEATING, ] ),
+}
+
+BACKLIGHT_EVENTS = {
+    Events.PRINT_STARTED: BACKLIGHT_PRINTING,
+    Events.PRINT_PAUSED: BACKLIGHT_PAUSED,
+    Events.PRINT_RESUMED: BACKLIGHT_PRINTING,
+    Events.PRINT_DONE: BACKLIGHT_DONE,
+    Events.PRINT_FAILED: BACKLIGHT_FAILED,
+    Events.PRINT_CANCELLED: BACKLIGHT_DONE,
+    Events.CONNECTED: BACKLIGHT_CONNECTED,
+    Events.DISCONNECTED: BACKLIGHT_DISCONNECTED,
+}
+
+# a heater is "heating" while it is this much (°C) below its target
+HEATING_TOLERANCE = 3.0
+
+# the part of OctoPrint's current data the screen shows
+CurrentData = namedtuple( 'CurrentData', [ 'eta', 'percent', ] )
+
+# progress and remaining seconds of the slicer's M73 lines, if any
+SlicerProgress = namedtuple( 'SlicerProgress', [ 'percent', 'eta', ] )
+
+class LcdprocPrinterCallback(PrinterCallback):
+
+    def __init__(self, plugin):
+        self.plugin = plugin
+
+    def on_printer_add_temperature(self, data):
+        self.plugin.on_temperature(data)
+
+    def on_printer_send_current_data(self, data):
+        self.plugin.on_current_data(data)
 
 class LcdprocPlugin(octoprint.plugin.SettingsPlugin,
     octoprint.plugin.AssetPlugin,
@@ -23,13 +223,44 @@ class LcdprocPlugin(octoprint.plugin.SettingsPlugin,
 ):
 
     lcd = None
+    lcd_geometry = None
+    message_over_filename = False
+    connection = None
     timer_screen = None
     timer_seconds = None
-    screen_priority_state = STATE_IDLE
-    start_timestamp = None
-    printing_filename = None
-    printing_percent = None
-    printing_eta = None
+    timer_health = None
+    timer_notifications = None
+    timer_result = None
+    notifications = None
+    state = DisplayState()
+    rendered_state = None
+    current_data = CurrentData( None, None )
+    slicer_progress = SlicerProgress( None, None )
+    estimator = None
+    print_key = None
+    event_handlers = MappingProxyType({})
+    gcode_handlers = MappingProxyType({})
+    tracker = None
+    job_totals = None
+    job_scanner = None
+    job_scan = None
+    console = None
+    alerts = None
+    metadata = None
+    selected_file = None
+    history = None
+    keypad = None
+    outputs = None
+    backlight = None
+    worker = None
+    scheduler = None
+    idle_mode = False
+    printer_callback = None
+    selected_page = SCREEN_PAGES[0]
+
+    def __init__(self):
+        super(LcdprocPlugin, self).__init__()
+        self.state_lock = threading.Lock()
 
     ##~~ SettingsPlugin mixin
 
@@ -78,9 +309,51 @@ class LcdprocPlugin(octoprint.plugin.SettingsPlugin,
             "hide_page_when_idle": True,
             "priority_printing": "foreground",
             "priority_non_printing": "info",
+            "priority_paused": "foreground",
+            "priority_error": "alert",
             "idle_time_minutes": 60,
             "title_show": False,
             "title_text": "OctoPrint",
+            "filename_scroll": False,
+            "keys_enabled": False,
+            "key_screen_prev": "Up",
+            "key_screen_next": "Down",
+            "key_acknowledge": "Enter",
+            "key_pause": "Escape",
+            "key_long_press_ms": 1000,
+            "outputs_enabled": False,
+            "output_printing": 1,
+            "output_paused": 2,
+            "output_error": 4,
+            "output_done": 8,
+            "output_heating": 16,
+            "backlight_enabled": False,
+            "backlight_printing": "on",
+            "backlight_paused": "blink",
+            "backlight_failed": "blink",
+            "backlight_done": "on",
+            "backlight_idle": "off",
+            "backlight_connected": "on",
+            "backlight_disconnected": "off",
+            "backlight_alert": "flash",
+            "backlight_key_seconds": 30,
+            "eta_estimator_enabled": False,
+            "health_check_enabled": False,
+            "health_check_interval_seconds": 300,
+            "message_enabled": True,
+            "message_ttl_seconds": 60,
+            "notifications_enabled": True,
+            "notification_ttl_seconds": 10,
+            "result_screen_enabled": True,
+            "result_alert_seconds": 60,
+            "slicer_progress_enabled": True,
+            "job_screen_enabled": True,
+            "console_screen_enabled": False,
+            "metadata_screen_enabled": True,
+            "filament_density": 1.24,
+            "history_screen_enabled": True,
+            "alerts_enabled": True,
+            "alert_patterns": ", ".join( ALERT_PATTERNS ),
         }
 
     def get_template_configs(self):
@@ -92,100 +365,476 @@ class LcdprocPlugin(octoprint.plugin.SettingsPlugin,
         ]
 
     def on_settings_save(self, data):
-        anything_changed = False
         current_values = self.get_settings_defaults()
         for key in self.get_settings_defaults().keys():
             current_values[key] = self._settings.get([key])
         octoprint.plugin.SettingsPlugin.on_settings_save(self, data)
-        for key in self.get_settings_defaults().keys():
-            if not current_values[key] == self._settings.get([key]):
-                anything_changed = True
-                break
+        changed = [ key for key in self.get_settings_defaults().keys() if not current_values[key] == self._settings.get([key]) ]
+        if not changed or not self.worker:
+            return
 
-        if anything_changed:
+        items = set( SETTINGS_RENDER[key] for key in changed if key in SETTINGS_RENDER )
+        if RENDER_RECONNECT in items:
+            # everything is rebuilt on the new connection anyway
             self._logger.info("Configuration changed, destroying connection")
-            if self.lcd:
-                self.lcd.close_session()
-                self.lcd = None
+            items = set([ RENDER_RECONNECT ])
+        else:
+            self._logger.info("Configuration changed: %s" % ", ".join( sorted( changed ) ) )
+
+        for item in items:
+            self.worker.mark( item )
 
     def on_startup(self, host, port):
-        self.initialize_lcd()
+        # nothing here may wait for LCDd: the session is established by the
+        # worker, which renders the latest state once the connection is up
+        self.worker = DisplayWorker( self.render, self._logger, fps = MAX_FRAME_RATE )
+        self.worker.start()
+        self.scheduler = Scheduler( self._logger )
+        self.scheduler.start()
+        self.timer_seconds = self.scheduler.timer( self.on_timer_seconds )
+        self.timer_screen = self.scheduler.timer( self.on_timer_screen )
+        self.timer_health = self.scheduler.timer( self.on_timer_health )
+        self.timer_notifications = self.scheduler.timer( self.refresh_notifications )
+        self.timer_result = self.scheduler.timer( self.on_timer_result )
+        self.notifications = Notifications( NOTIFICATION_LIMIT )
+        self.mark_timers = dict()
+        self.deferred = set()
+        self.connection = ConnectionManager()
+        self.outputs = Outputs( self.write_outputs, lambda delay: self.mark_later( RENDER_OUTPUTS, delay ) )
+        self.backlight = Backlight( self.write_backlight, lambda delay: self.mark_later( RENDER_BACKLIGHT, delay ) )
+        self.metadata = MetadataCache( self.load_metadata )
+        self.history = PrintHistory( os.path.join( self.get_plugin_data_folder(), "history" ) )
+        self.estimator = EtaEstimator( DurationStore( os.path.join( self.get_plugin_data_folder(), "durations.json" ) ) )
+        self.initialize_event_handlers()
+        self.tracker = GcodeTracker()
+        self.job_totals = JobTotalsCache()
+        self.job_scanner = DisplayWorker( self.scan_job, self._logger, name = "LCDproc job scan" )
+        self.job_scanner.start()
+        self.initialize_gcode_handlers()
+        self.initialize_console()
+        self.initialize_alerts()
+        self.printer_callback = LcdprocPrinterCallback( self )
+        self._printer.register_callback( self.printer_callback )
+        self.mark_screen( RENDER_CONNECT )
+
+    def on_shutdown(self):
+        if self.printer_callback:
+            self._printer.unregister_callback( self.printer_callback )
+            self.printer_callback = None
+        if self.scheduler:
+            self.scheduler.stop()
+        if self.worker:
+            self.worker.stop()
+        if self.job_scanner:
+            self.job_scanner.stop()
 
     def on_event(self, event, payload):
-        if event in [ Events.PRINT_STARTED, Events.PRINT_DONE, Events.PRINT_CANCELLED, Events.PRINT_FAILED, ]:
-            if self.timer_screen:
-                self.timer_screen.cancel()
-                self.timer_screen = None
+        handler = self.event_handlers.get( event )
+        if handler is None:
+            return
+        idle_mode = self.idle_mode
+        if idle_mode:
+            self.leave_idle_mode()
+        handler( event, payload )
+        if idle_mode:
+            self.return_to_idle_mode()
 
-            if not self.timer_seconds:
-                self.timer_seconds = RepeatedTimer( 15.0, self.on_timer_seconds )
+    def initialize_event_handlers(self):
+        # built once, on_event is called for every OctoPrint event
+        self.event_handlers = MappingProxyType({
+            Events.PRINT_STARTED: self.on_print_started,
+            Events.PRINT_DONE: self.on_print_ended,
+            Events.PRINT_CANCELLED: self.on_print_ended,
+            Events.PRINT_FAILED: self.on_print_ended,
+            Events.PRINT_PAUSED: self.on_print_paused,
+            Events.PRINT_RESUMED: self.on_print_resumed,
+            Events.CONNECTED: self.on_printer_connected,
+            Events.DISCONNECTED: self.on_printer_disconnected,
+            Events.ERROR: self.on_printer_error,
+            Events.FILE_SELECTED: self.on_file_selected,
+            Events.FILE_DESELECTED: self.on_file_deselected,
+            Events.FILE_ADDED: self.on_file_changed,
+            Events.FILE_REMOVED: self.on_file_changed,
+            Events.METADATA_ANALYSIS_FINISHED: self.on_file_changed,
+            Events.UPLOAD: self.on_upload,
+            Events.FILAMENT_CHANGE: self.on_filament_change,
+        })
 
-            if event in [ Events.PRINT_STARTED, ]:
-                self.screen_priority_state = STATE_PRINTING
-                self.printing_filename = payload['name']
-                self.start_timestamp = datetime.now()
-                self.update_screen_TextFileName()
-                self.update_screen_TextETA()
-                self.update_screen_TextPercent()
-                self.update_screen_TextFIN()
+    def initialize_gcode_handlers(self):
+        # built once, the sent hook is called for every line sent to the printer
+        handlers = self.tracker.commands()
+        handlers.update({
+            "G0": self.on_gcode_move,
+            "G1": self.on_gcode_move,
+            "M73": self.on_gcode_M73,
+            "M117": self.on_gcode_M117,
+        })
+        self.gcode_handlers = MappingProxyType( handlers )
 
-                if not self.timer_seconds.is_alive():
-                    self.timer_seconds.start()
+    def update_indicators(self, event):
+        if event in OUTPUT_EVENTS and self.outputs:
+            switch_on, switch_off = OUTPUT_EVENTS[event]
+            for state in switch_on:
+                self.outputs.set( state, True )
+            for state in switch_off:
+                self.outputs.set( state, False )
 
-                self.update_screen_priority()
+        if event in BACKLIGHT_EVENTS and self.backlight:
+            self.backlight.set_state( BACKLIGHT_EVENTS[event] )
 
-            if event in [ Events.PRINT_DONE, Events.PRINT_CANCELLED, Events.PRINT_FAILED, ]:
-                self.screen_priority_state = STATE_NON_PRINTING
-                self.start_timestamp = None
-                self.printing_eta = None
-                self.printing_percent = None
+    def on_print_started(self, event, payload):
+        self.update_indicators( event )
+        self.cancel_timer_screen()
+        self.clear_alert()
 
-                self.timer_seconds.cancel()
-                self.timer_seconds = None
+        if self._settings.get_boolean(["eta_estimator_enabled"]):
+            self.print_key = self.get_print_key( payload )
+            self.estimator.start( self.print_key, time.monotonic() )
+        self.current_data = CurrentData( None, None )
+        self.slicer_progress = SlicerProgress( None, None )
+        self.tracker.reset()
+        self.selected_file = ( payload.get('origin'), payload.get('path') )
+        self.scheduler.cancel( self.timer_result )
+        self.update_state( priority_state = STATE_PRINTING, status = None, filename = payload['name'], started = datetime.now(),
+            layer = None, layers = None, filament = None, filament_total = None, metadata = self.metadata.get( *self.selected_file ),
+            result_priority = "hidden" )
+        self.start_job_scan( payload, self.state.started )
+        self.notify_event( "Print started" )
 
-                if self._settings.get_boolean(["hide_page_when_idle"]):
-                    self.timer_screen = ResettableTimer( 60 * self._settings.get_int(["idle_time_minutes"]), self.on_timer_screen )
-                    self.timer_screen.start()
+        if not self.timer_seconds.queued():
+            self.scheduler.reschedule( self.timer_seconds, self.eta_refresh_interval() )
 
-                self.update_screen_priority()
+    def on_print_ended(self, event, payload):
+        self.update_indicators( event )
+        self.cancel_timer_screen()
 
-    def update_screen_TextFileName(self):
-        if self.printing_filename is None:
-            visible_filename = " - "
+        # the job screen keeps the filament of the whole print, not only up
+        # to the start of the last layer
+        filament = self.tracker.filament if self.state.layer is not None else None
+
+        def ended(state):
+            # an error reported before the failure stays on the screen
+            return replace( state,
+                priority_state = state.priority_state if state.priority_state == STATE_ERROR else STATE_NON_PRINTING,
+                status = None if state.status == "PAUSED" else state.status,
+                started = None, eta = None, percent = None, filament = filament )
+        self.swap_state( ended )
+        self.current_data = CurrentData( None, None )
+        self.slicer_progress = SlicerProgress( None, None )
+
+        if event == Events.PRINT_DONE and self.print_key and payload.get('time'):
+            # OctoPrint's print time includes the pauses
+            duration = payload['time'] - self.estimator.paused
+            try:
+                self.estimator.store.add( self.print_key, duration )
+            except (IOError, OSError) as error:
+                self._logger.warning("Unable to record the print duration: %s" % error )
+        self.estimator.stop()
+        self.print_key = None
+
+        if self._settings.get_boolean(["history_screen_enabled"]):
+            try:
+                self.history.add( time.time(), payload.get('name'), payload.get('time'), HISTORY_RESULTS[event] )
+            except (IOError, OSError) as error:
+                self._logger.warning("Unable to record the print in the history: %s" % error )
+            self.mark_screen( 'TextHistory' )
+
+        self.scheduler.cancel( self.timer_seconds )
+
+        if event in RESULT_TEXTS and self._settings.get_boolean(["result_screen_enabled"]):
+            self.update_state( result = PrintResult( RESULT_TEXTS[event], payload.get('time'), datetime.now() ), result_priority = "alert" )
+            self.scheduler.reschedule( self.timer_result, self._settings.get_int(["result_alert_seconds"]) )
+
+        self.start_timer_screen()
+
+    def on_print_paused(self, event, payload):
+        self.update_indicators( event )
+        self.estimator.pause( time.monotonic() )
+        self.update_state( priority_state = STATE_PAUSED, status = "PAUSED" )
+
+    def on_print_resumed(self, event, payload):
+        self.update_indicators( event )
+        self.estimator.resume( time.monotonic() )
+        self.update_state( priority_state = STATE_PRINTING, status = None )
+
+    def on_printer_connected(self, event, payload):
+        self.update_indicators( event )
+        self.clear_alert()
+        previous = self.swap_state( lambda state: replace( state,
+            priority_state = STATE_NON_PRINTING if state.priority_state == STATE_ERROR else state.priority_state,
+            status = None ) )
+        if previous.priority_state == STATE_ERROR:
+            self.start_timer_screen()
+
+    def on_printer_disconnected(self, event, payload):
+        self.update_indicators( event )
+        self.swap_state( lambda state: state if state.priority_state == STATE_ERROR else replace( state, status = "OFFLINE" ) )
+
+    def on_printer_error(self, event, payload):
+        self.update_indicators( event )
+        self.update_state( priority_state = STATE_ERROR, status = "ERROR" )
+        # shown until acknowledged, at most until the idle timer goes off
+        self.start_timer_screen()
+
+    def on_file_selected(self, event, payload):
+        self.selected_file = ( payload.get('origin'), payload.get('path') )
+        self.update_state( metadata = self.metadata.get( *self.selected_file ) )
+
+    def on_file_deselected(self, event, payload):
+        self.selected_file = None
+        self.update_state( metadata = None )
+
+    def on_file_changed(self, event, payload):
+        # uploaded again, removed or analysed: the cached metadata is stale
+        key = ( payload.get('storage') or payload.get('origin'), payload.get('path') )
+        self.metadata.invalidate( *key )
+        if key == self.selected_file:
+            self.update_state( metadata = self.metadata.get( *key ) )
+
+    def on_upload(self, event, payload):
+        self.notify_event( "Uploaded %s" % strip_filename( payload.get('name') or "" ) )
+
+    def on_filament_change(self, event, payload):
+        self.notify_event( "Filament change" )
+
+    def load_metadata(self, storage, path):
+        try:
+            return self._file_manager.get_metadata( storage, path )
+        except Exception:
+            return None
+
+    def start_timer_screen(self):
+        if self._settings.get_boolean(["hide_page_when_idle"]):
+            self.scheduler.reschedule( self.timer_screen, 60 * self._settings.get_int(["idle_time_minutes"]) )
         else:
-            visible_filename = self.printing_filename
+            self.cancel_timer_screen()
+
+    def cancel_timer_screen(self):
+        if self.scheduler:
+            self.scheduler.cancel( self.timer_screen )
+
+    def start_job_scan(self, payload, started):
+        # the totals of the job screen come from a scan of the file, made
+        # once per file on the scan thread; only the latest print is scanned
+        if payload.get('origin') != "local" or not self._settings.get_boolean(["job_screen_enabled"]):
+            return
+        try:
+            path = self._file_manager.path_on_disk( payload['origin'], payload['path'] )
+        except Exception:
+            return
+        self.job_scan = ( path, started )
+        self.job_scanner.mark( "scan" )
+
+    def scan_job(self, items):
+        path, started = self.job_scan
+        try:
+            totals = self.job_totals.get( path )
+        except (IOError, OSError) as error:
+            self._logger.warning("Unable to scan '%s' for the job screen: %s" % ( path, error ) )
+            return
+
+        def scanned(state):
+            # checked under the state lock: a print started meanwhile keeps
+            # its own totals
+            if state.started is not started:
+                return state
+            return replace( state, layers = totals.layers, filament_total = totals.filament )
+        self.swap_state( scanned )
+
+    def get_print_key(self, payload):
+        # the file hash identifies the same job across renames and uploads
+        origin, path = payload.get('origin'), payload.get('path')
+        return self.metadata.get( origin, path ).hash or "%s:%s:%s" % ( origin, path, payload.get('size') )
+
+    def swap_state(self, change):
+        """ Replaces the display state with change(state), returns the previous one """
+        with self.state_lock:
+            previous = self.state
+            self.state = change( previous )
+        if self.state != previous:
+            self.mark_screen( RENDER_STATE )
+        return previous
+
+    def update_state(self, **changes):
+        return self.swap_state( lambda state: replace( state, **changes ) )
+
+    def mark_screen(self, *items):
+        if self.worker:
+            for item in items:
+                self.worker.mark( item )
+
+    def mark_later(self, item, delay):
+        # one timer per item, an earlier request wins over a later one
+        timer = self.mark_timers.get( item )
+        if timer is None:
+            timer = self.mark_timers[item] = self.scheduler.timer( self.worker.mark, item )
+        self.scheduler.reschedule( timer, delay, earlier_only = True )
+
+    def render(self, items):
+        # one snapshot for the whole frame
+        state = self.state
+        if RENDER_STATE in items:
+            previous = self.rendered_state
+            for item, key in STATE_RENDER_KEYS:
+                if previous is None or key( state ) != key( previous ):
+                    items.add( item )
 
+        for item in RENDER_ORDER:
+            if item not in items:
+                continue
+            if item == RENDER_RECONNECT:
+                if self.lcd:
+                    self.lcd.close_session()
+                    self.lcd = None
+                self.connection.reset()
+                self.ensure_screen('OctPriSCR1')
+            elif item == RENDER_CONNECT:
+                self.ensure_screen('OctPriSCR1')
+            elif item == RENDER_STATE:
+                self.rendered_state = state
+            elif item == RENDER_LAYOUT:
+                self.update_screen_layout()
+            elif item == RENDER_KEYPAD:
+                if self.ensure_live_session( item ):
+                    for key in list( self.lcd.keys ):
+                        self.lcd.del_key( key )
+                    self.initialize_keypad()
+            elif item == RENDER_OUTPUTS_CONFIG:
+                self.initialize_outputs()
+            elif item == RENDER_BACKLIGHT_CONFIG:
+                self.initialize_backlight()
+            elif item == RENDER_HEALTH_CONFIG:
+                self.initialize_health_check()
+            elif item == RENDER_HEALTH:
+                self.check_health()
+            elif item == RENDER_ALERTS_CONFIG:
+                self.initialize_alerts()
+            elif item == RENDER_PAGES:
+                self.initialize_console()
+                if self.ensure_live_session( item ):
+                    self.initialize_pages( state )
+                    items.add( RENDER_PRIORITY )
+            elif item == RENDER_PRIORITY:
+                self.update_screen_priority( state )
+            elif item == RENDER_OUTPUTS:
+                self.outputs.flush()
+            elif item == RENDER_BACKLIGHT:
+                self.backlight.flush()
+            elif item == 'TitleText':
+                self.update_screen_TitleText()
+            else:
+                getattr( self, "update_screen_%s" % item )( state )
+
+    def update_screen_layout(self):
+        screen, screen_width, screen_height = self.ensure_screen('OctPriSCR1')
+        if not screen:
+            return
+
+        lines = self.main_screen_lines( self.update_screen_title( screen ) )
+        for ref, line in lines.items():
+            if ref not in screen.widgets:
+                continue
+            widget = screen.widgets[ref]
+            if hasattr( widget, 'top' ):
+                widget.set_top( line )
+                widget.set_bottom( line )
+            else:
+                widget.set_y( line )
+            if ref == 'TextMessage':
+                widget.set_right( self.message_right() )
+            widget.update()
+        self.mark_screen( 'TextFileName', 'TextMessage' )
+
+    def main_screen_lines(self, first_linenum):
+        # line of each main screen widget. A display without a line left for
+        # the message (e.g. 2 lines) shows it in place of the file name.
+        lines = { ref: first_linenum + line for ref, line in MAIN_SCREEN_LINES.items() }
+        self.message_over_filename = lines['TextMessage'] > self.lcd_geometry[1]
+        if self.message_over_filename:
+            lines['TextMessage'] = lines['TextFileName']
+        return lines
+
+    def message_right(self):
+        # over the file name the percentage stays visible
+        return self.lcd_geometry[0] - ( 5 if self.message_over_filename else 0 )
+
+    def update_screen_title(self, screen):
+        # adds or removes the title, returns the first line below it
+        if self._settings.get_boolean(["title_show"]):
+            if 'TitleText' not in screen.widgets:
+                screen.add_title_widget("TitleText", text = self._settings.get(["title_text"]) )
+            screen.set_heartbeat("on")
+            return 2
+
+        if 'TitleText' in screen.widgets:
+            screen.del_widget("TitleText")
+        screen.set_heartbeat("off")
+        return 1
+
+    def update_screen_TitleText(self):
         screen, screen_width, screen_height = self.ensure_screen('OctPriSCR1')
+        if screen and 'TitleText' in screen.widgets:
+            screen.widgets['TitleText'].set_text( self._settings.get(["title_text"]) )
+            screen.widgets['TitleText'].update()
+
+    def update_screen_TextFileName(self, state):
+        screen, screen_width, screen_height = self.ensure_screen('OctPriSCR1')
+
+        # the scroller spans the line but the last 5 characters
+        if self.message_over_filename and state.message:
+            visible_filename = ""
+        elif state.filename is None:
+            visible_filename = " - "
+        elif self._settings.get_boolean(["filename_scroll"]) or not screen_width:
+            visible_filename = abbreviate_filename( state.filename, None )
+        else:
+            visible_filename = abbreviate_filename( state.filename, screen_width - 5 )
+
         if screen and 'TextFileName' in screen.widgets:
             self._logger.info("LCDd 'TextFileName' == '%s'" % visible_filename )
             screen.widgets['TextFileName'].set_text( visible_filename )
             screen.widgets['TextFileName'].update()
 
-    def update_screen_priority(self):
+    def update_screen_priority(self, state):
         screen, screen_width, screen_height = self.ensure_screen('OctPriSCR1')
         if screen:
-            if self.screen_priority_state == STATE_IDLE:
+            new_priority = None
+            priority_state = state.priority_state
+            if priority_state == STATE_IDLE:
                 if self._settings.get_boolean(["hide_page_when_idle"]):
-                    self._logger.info("Switching screen priority: hidden")
-                    self.lcd.screens['OctPriSCR1'].set_priority("hidden")
+                    new_priority = "hidden"
                 else:
-                    self.screen_priority_state = STATE_NON_PRINTING
+                    priority_state = STATE_NON_PRINTING
 
-            if self.screen_priority_state == STATE_NON_PRINTING:
+            if priority_state == STATE_NON_PRINTING:
                 new_priority = self._settings.get(["priority_non_printing"])
-                self._logger.info("Switching screen priority: %s" % new_priority )
-                self.lcd.screens['OctPriSCR1'].set_priority( new_priority )
 
-            if self.screen_priority_state == STATE_PRINTING:
+            if priority_state == STATE_PRINTING:
                 new_priority = self._settings.get(["priority_printing"])
-                self._logger.info("Switching screen priority: %s" % new_priority )
-                self.lcd.screens['OctPriSCR1'].set_priority( new_priority )
 
-    def update_screen_TextPercent(self):
-        if self.printing_percent is None:
+            if priority_state == STATE_PAUSED:
+                new_priority = self._settings.get(["priority_paused"])
+
+            if priority_state == STATE_ERROR:
+                new_priority = self._settings.get(["priority_error"])
+
+            if state.alert:
+                new_priority = "alert"
+
+            self._logger.info("Switching screen priority: %s" % new_priority )
+            for ref in SCREEN_PAGES:
+                if ref not in self.lcd.screens:
+                    continue
+                if ref == self.selected_page or new_priority == "hidden":
+                    self.lcd.screens[ref].set_priority( new_priority )
+                else:
+                    self.lcd.screens[ref].set_priority( "background" )
+
+    def update_screen_TextPercent(self, state):
+        if state.percent is None:
             visible_percent = " - "
         else:
-            visible_percent = "%d%%" % ( self.printing_percent )
+            visible_percent = "%d%%" % ( state.percent )
 
         screen, screen_width, screen_height = self.ensure_screen('OctPriSCR1')
         if screen and 'TextPercent' in screen.widgets:
@@ -194,12 +843,14 @@ class LcdprocPlugin(octoprint.plugin.SettingsPlugin,
             screen.widgets['TextPercent'].set_x( screen_width - ( len( visible_percent ) - 1 ) )
             screen.widgets['TextPercent'].update()
 
-    def update_screen_TextETA( self ):
-        if self.printing_eta is None:
+    def update_screen_TextETA( self, state ):
+        if state.status is not None:
+            visible_eta = state.status
+        elif state.eta is None:
             visible_eta = " - "
         else:
             # limiting display to 99 hour 60 minutes
-            eta_calcwith = self.printing_eta if self.printing_eta < 360000 else 360000 - 1
+            eta_calcwith = state.eta if state.eta < 360000 else 360000 - 1
             eta_hours = eta_calcwith // 3600
             eta_minutes = ( eta_calcwith - ( eta_hours * 3600 ) ) // 60
             visible_eta = "%02d:%02d" % ( eta_hours, eta_minutes )
@@ -210,11 +861,138 @@ class LcdprocPlugin(octoprint.plugin.SettingsPlugin,
             screen.widgets['TextETA'].set_text( visible_eta )
             screen.widgets['TextETA'].update()
 
-    def update_screen_TextFIN( self ):
-        if self.printing_eta is None:
+    def update_screen_TextMessage( self, state ):
+        visible_message = state.message or ""
+
+        screen, screen_width, screen_height = self.ensure_screen('OctPriSCR1')
+        if screen and 'TextMessage' in screen.widgets:
+            self._logger.info("LCDd 'TextMessage' == '%s'" % visible_message )
+            screen.widgets['TextMessage'].set_text( visible_message )
+            screen.widgets['TextMessage'].update()
+
+    def update_screen_TextLayer( self, state ):
+        if state.layer is None:
+            visible_layer = "Layer -"
+        elif state.layers is None:
+            visible_layer = "Layer %d" % ( state.layer )
+        else:
+            visible_layer = "Layer %d/%d" % ( state.layer, state.layers )
+
+        screen, screen_width, screen_height = self.ensure_screen('OctPriJOB')
+        if screen and 'TextLayer' in screen.widgets:
+            self._logger.info("LCDd 'TextLayer' == '%s'" % visible_layer )
+            screen.widgets['TextLayer'].set_text( visible_layer )
+            screen.widgets['TextLayer'].update()
+
+    def update_screen_TextFilament( self, state ):
+        if state.filament is None:
+            visible_filament = "Fil. -"
+        elif state.filament_total is None:
+            visible_filament = "Fil. %.2fm" % ( max( state.filament, 0 ) / 1000 )
+        else:
+            visible_filament = "Fil. %.2f/%.2fm" % ( max( state.filament, 0 ) / 1000, state.filament_total / 1000 )
+
+        screen, screen_width, screen_height = self.ensure_screen('OctPriJOB')
+        if screen and 'TextFilament' in screen.widgets:
+            self._logger.info("LCDd 'TextFilament' == '%s'" % visible_filament )
+            screen.widgets['TextFilament'].set_text( visible_filament )
+            screen.widgets['TextFilament'].update()
+
+    def update_screen_TextConsole( self, state ):
+        screen, screen_width, screen_height = self.ensure_screen('OctPriCON')
+        if not screen or not self.console:
+            return
+
+        lines = self.console.lines( screen_height )
+        for index in range( screen_height ):
+            ref = "TextConsole%d" % ( index + 1 )
+            visible_line = lines[index].strip().replace( '"', "'" )[:screen_width] if index < len( lines ) else ""
+            if ref in screen.widgets and screen.widgets[ref].text != visible_line:
+                screen.widgets[ref].set_text( visible_line )
+                screen.widgets[ref].update()
+
+    def update_screen_TextMetadata( self, state ):
+        metadata = state.metadata
+        visible_lines = [ "Est. -", "Fil. -", "Size -", ]
+        if metadata and metadata.estimated_time is not None:
+            estimated_time = int( metadata.estimated_time )
+            visible_lines[0] = "Est. %02d:%02d" % ( estimated_time // 3600, ( estimated_time % 3600 ) // 60 )
+        if metadata and metadata.filament_length is not None:
+            visible_lines[1] = "Fil. %.2fm" % ( metadata.filament_length / 1000 )
+            if metadata.filament_volume is not None:
+                visible_lines[1] += " %dg" % round( metadata.filament_volume * float( self._settings.get(["filament_density"]) ) )
+        if metadata and metadata.dimensions is not None:
+            visible_lines[2] = "%dx%dx%dmm" % metadata.dimensions
+
+        screen, screen_width, screen_height = self.ensure_screen('OctPriMETA')
+        if not screen:
+            return
+        for index, visible_line in enumerate( visible_lines ):
+            ref = "TextMetadata%d" % ( index + 1 )
+            if ref in screen.widgets and screen.widgets[ref].text != visible_line:
+                self._logger.info("LCDd '%s' == '%s'" % ( ref, visible_line ) )
+                screen.widgets[ref].set_text( visible_line )
+                screen.widgets[ref].update()
+
+    def update_screen_TextHistory( self, state ):
+        screen, screen_width, screen_height = self.ensure_screen('OctPriHIST')
+        if not screen:
+            return
+
+        prints, done, seconds = self.history.statistics()
+        if prints:
+            visible_lines = [ "%dh %d%% OK of %d" % ( seconds // 3600, 100 * done // prints, prints ) ]
+        else:
+            visible_lines = [ "No prints yet" ]
+        for entry in self.history.recent():
+            visible_lines.append( "%s %d:%02d %s" % ( HISTORY_MARKS.get( entry.result, "?" ), entry.duration // 3600, ( entry.duration % 3600 ) // 60, entry.name ) )
+
+        for index in range( screen_height ):
+            ref = "TextHistory%d" % ( index + 1 )
+            visible_line = visible_lines[index].replace( '"', "'" )[:screen_width] if index < len( visible_lines ) else ""
+            if ref in screen.widgets and screen.widgets[ref].text != visible_line:
+                self._logger.info("LCDd '%s' == '%s'" % ( ref, visible_line ) )
+                screen.widgets[ref].set_text( visible_line )
+                screen.widgets[ref].update()
+
+    def update_screen_TextResult( self, state ):
+        # the screen is built once per session, showing a result only
+        # changes its texts and its priority
+        screen, screen_width, screen_height = self.ensure_screen('OctPriRES')
+        if not screen:
+            return
+
+        result = state.result
+        if result:
+            duration = int( result.duration or 0 )
+            duration = "%d:%02d:%02d" % ( duration // 3600, ( duration % 3600 ) // 60, duration % 60 )
+            finished = "%02d:%02d" % ( result.finished.hour, result.finished.minute )
+            if 'TextResultEnd' in screen.widgets:
+                visible_lines = {
+                    'TitleResult': result.text,
+                    'TextResultTime': "Time %s" % duration,
+                    'TextResultEnd': "Ended %s" % finished,
+                }
+            else:
+                visible_lines = {
+                    'TitleResult': result.text,
+                    'TextResultTime': "%s @%s" % ( duration, finished ),
+                }
+            for ref, visible_line in visible_lines.items():
+                if ref in screen.widgets and screen.widgets[ref].text != visible_line:
+                    self._logger.info("LCDd '%s' == '%s'" % ( ref, visible_line ) )
+                    screen.widgets[ref].set_text( visible_line )
+                    screen.widgets[ref].update()
+
+        if screen.priority != state.result_priority:
+            self._logger.info("Switching result screen priority: %s" % state.result_priority )
+            screen.set_priority( state.result_priority )
+
+    def update_screen_TextFIN( self, state ):
+        if state.eta is None:
             visible_fin = " - "
         else:
-            FINISH_DATETIME = datetime.now() + timedelta( seconds = self.printing_eta )
+            FINISH_DATETIME = datetime.now() + timedelta( seconds = state.eta )
             NOW_DATE = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
             FIN_DATE = FINISH_DATETIME.replace(hour=0, minute=0, second=0, microsecond=0)
 
@@ -232,24 +1010,433 @@ class LcdprocPlugin(octoprint.plugin.SettingsPlugin,
 
 
     def on_print_progress(self, storage, path, progress ):
-        self.printing_percent = progress
+        if self.slicer_progress.percent is None:
+            self.update_state( percent = progress )
+
+    def on_current_data(self, data):
+        if self.state.priority_state != STATE_PRINTING:
+            return
+
+        progress = data.get('progress') or {}
+        completion = progress.get('completion')
+        eta = progress.get('printTimeLeft')
+        percent = None if completion is None else int( completion )
+        # the slicer's M73 values win over OctoPrint's and our own estimates
+        slicer = self.slicer_progress
+        if slicer.eta is not None:
+            eta = slicer.eta
+        elif self.print_key:
+            eta = self.estimator.update( time.monotonic(), completion, eta )
+        if slicer.percent is not None:
+            percent = slicer.percent
+        current = CurrentData( eta, percent )
+        if current == self.current_data:
+            return
+
+        self.current_data = current
+        if current.percent is None:
+            self.update_state( eta = current.eta )
+        else:
+            self.update_state( eta = current.eta, percent = current.percent )
+
+    ##~~ gcode hooks, called for every line sent to the printer: anything but
+    ##~~ the few commands of interest has to return after one lookup
+
+    def on_gcode_sent(self, comm_instance, phase, cmd, cmd_type, gcode, *args, **kwargs):
+        handler = self.gcode_handlers.get( gcode )
+        if handler is None:
+            return
+        handler( cmd )
+
+    def on_gcode_received(self, comm_instance, line, *args, **kwargs):
+        alerts = self.alerts
+        if alerts is not None and alerts.match( line ):
+            self.on_alert( line.strip() )
+
+        # redraws are limited, a burst of lines costs one frame
+        console = self.console
+        if console is not None and console.add( line ):
+            self.mark_later( 'TextConsole', CONSOLE_REDRAW_INTERVAL )
+        return line
+
+    def on_alert(self, line):
+        # shown right away: no frame pacing and no backlight debouncing. The
+        # alert is an overlay, a running print keeps being tracked below it.
+        if self.state.message != line:
+            self._logger.warning("Printer alert: %s" % line )
+        if self.idle_mode:
+            self.leave_idle_mode()
+        if self.state.priority_state not in [ STATE_PRINTING, STATE_PAUSED, ]:
+            self.start_timer_screen()
+        self.selected_page = SCREEN_PAGES[0]
+        self.notify( line, NOTIFY_ALERT, None, source = "alert" )
+        self.update_state( alert = True )
+        if self.backlight:
+            self.backlight.set_alert( True )
+        self.mark_screen( RENDER_PRIORITY, RENDER_BACKLIGHT )
+        self.worker.hurry()
+
+    def clear_alert(self):
+        if not self.state.alert:
+            return
+        # the alert message has no TTL, it goes with the alert
+        self.notifications.remove( "alert" )
+        self.refresh_notifications()
+        self.update_state( alert = False )
+        if self.backlight:
+            self.backlight.set_alert( False )
+
+    def on_gcode_move(self, cmd):
+        # the filament shown is updated with each layer
+        if self.tracker.move( cmd ) and self.state.priority_state == STATE_PRINTING:
+            self.update_state( layer = self.tracker.layer, filament = self.tracker.filament )
+
+    def on_gcode_M117(self, cmd):
+        self.show_message( cmd[4:].strip() )
+
+    def on_gcode_M73(self, cmd):
+        # M73 P<percent> R<minutes left>, other parameters (silent mode
+        # values, change times) are ignored
+        if self.state.priority_state != STATE_PRINTING or not self._settings.get_boolean(["slicer_progress_enabled"]):
+            return
+
+        percent, eta = self.slicer_progress
+        for parameter in cmd.split()[1:]:
+            try:
+                if parameter[0] == "P":
+                    percent = int( float( parameter[1:] ) )
+                elif parameter[0] == "R":
+                    eta = int( float( parameter[1:] ) * 60 )
+            except ValueError:
+                continue
+        progress = SlicerProgress( percent, eta )
+        if progress == self.slicer_progress:
+            return
+
+        self.slicer_progress = progress
+        changes = { name: value for name, value in progress._asdict().items() if value is not None }
+        if changes:
+            self.update_state( **changes )
+
+    def show_message(self, message):
+        # a new M117 replaces the previous one, an empty one clears it
+        if not self.notifications or not self._settings.get_boolean(["message_enabled"]):
+            return
+        if message:
+            self.notify( message, NOTIFY_MESSAGE, self._settings.get_int(["message_ttl_seconds"]), source = "M117" )
+        else:
+            self.notifications.remove( "M117" )
+            self.refresh_notifications()
+
+    def notify_event(self, text):
+        if self._settings.get_boolean(["notifications_enabled"]):
+            self.notify( text, NOTIFY_INFO, self._settings.get_int(["notification_ttl_seconds"]) )
 
-        self.update_screen_TextPercent()
+    def notify(self, text, priority, ttl, source = None):
+        self.notifications.push( text, priority, ttl, time.monotonic(), source = source )
+        self.refresh_notifications()
+
+    def refresh_notifications(self):
+        # shows the most important message and sets the timer to the next
+        # expiry; the state, and with it the screen, only changes when the
+        # message shown does
+        now = time.monotonic()
+        self.notifications.expire( now )
+        self.update_state( message = self.notifications.current() )
+        expires = self.notifications.next_expiry()
+        if expires is None:
+            self.scheduler.cancel( self.timer_notifications )
+        else:
+            self.scheduler.reschedule( self.timer_notifications, max( expires - now, 0 ) )
 
     def on_timer_seconds(self):
-        try:
-            self.printing_eta = self._printer.get_current_data()['progress']['printTimeLeft']
-        except:
-            self.printing_eta = None
+        if self.state.priority_state not in [ STATE_PRINTING, STATE_PAUSED, ]:
+            return
+        self.mark_screen( 'TextETA', 'TextFIN' )
+        self.scheduler.reschedule( self.timer_seconds, self.eta_refresh_interval() )
+
+    def on_temperature(self, data):
+        if not self.outputs:
+            return
+
+        heating = False
+        for heater in data.values():
+            if not isinstance( heater, dict ):
+                continue
+            if heater.get("target") and heater.get("actual") is not None and heater["actual"] < heater["target"] - HEATING_TOLERANCE:
+                heating = True
+                break
+        self.outputs.set( OUTPUT_HEATING, heating )
+
+    def write_outputs(self, value):
+        if not self._settings.get_boolean(["outputs_enabled"]):
+            return False
+
+        screen, screen_width, screen_height = self.ensure_screen('OctPriSCR1')
+        if not screen or not self.lcd.alive_session():
+            return False
+
+        self._logger.info("LCDd output == %d" % value )
+        return self.lcd.output( value ) is None
 
-        self.update_screen_TextPercent()
-        self.update_screen_TextETA()
-        self.update_screen_TextFIN()
+    def initialize_outputs(self):
+        if not self.outputs:
+            return
+        for state in OUTPUT_STATES:
+            self.outputs.set_bits( state, self._settings.get_int(["output_%s" % state]) or 0 )
+        self.outputs.reset()
+
+    def write_backlight(self, ref, mode):
+        if not self._settings.get_boolean(["backlight_enabled"]):
+            return False
+
+        screen, screen_width, screen_height = self.ensure_screen(ref)
+        if not screen or not self.lcd.alive_session():
+            return False
+
+        self._logger.info("LCDd '%s' backlight == %s" % ( ref, mode ) )
+        screen.set_backlight( mode )
+        return self.lcd.alive_session()
+
+    def initialize_backlight(self):
+        if not self.backlight:
+            return
+        for state in BACKLIGHT_STATES:
+            self.backlight.set_mode( state, self._settings.get(["backlight_%s" % state]) )
+        self.backlight.key_seconds = self._settings.get_int(["backlight_key_seconds"])
+        # the result screen is the visible one while it has alert priority
+        self.backlight.set_screens( SCREEN_PAGES + [ 'OctPriRES' ] )
+        self.backlight.reset()
+
+    def eta_refresh_interval(self):
+        # The ETA is shown in minutes, so refreshing makes sense right after
+        # the displayed value rolls over. Early in long prints a few minutes
+        # are skipped, near the end every minute is shown.
+        eta = self.state.eta
+        if eta is None or eta <= 0:
+            return ETA_UNKNOWN_INTERVAL
+
+        interval = eta % 60 or 60
+        interval += 60 * min( eta // 3600, ETA_MAX_SKIPPED_MINUTES )
+        return interval + ETA_MARGIN
+
+    def initialize_health_check(self):
+        if not self.lcd:
+            return
+        if self._settings.get_boolean(["health_check_enabled"]):
+            self.lcd.set_keepalive( self._settings.get_int(["health_check_interval_seconds"]) )
+        else:
+            self.lcd.set_keepalive( None )
+        self.schedule_health_check()
+
+    def schedule_health_check(self):
+        # the check is due after a whole interval without any LCDd traffic
+        if not self.lcd or not self._settings.get_boolean(["health_check_enabled"]):
+            self.scheduler.cancel( self.timer_health )
+            return
+        due = self.lcd.last_activity + self._settings.get_int(["health_check_interval_seconds"])
+        self.scheduler.reschedule( self.timer_health, max( due - time.monotonic(), 0 ) )
+
+    def on_timer_health(self):
+        if not self.lcd or not self.lcd.alive_session():
+            return
+        if time.monotonic() - self.lcd.last_activity < self._settings.get_int(["health_check_interval_seconds"]):
+            self.schedule_health_check()
+            return
+        self.mark_screen( RENDER_HEALTH )
+
+    def on_lcd_lost(self):
+        # LCDd closed the connection (e.g. restarted), no need to wait for a
+        # request or the health check to fail
+        self._logger.warning("LCDd closed the connection, reconnecting")
+        self.mark_screen( RENDER_CONNECT )
+
+    def check_health(self):
+        if self.lcd and self.lcd.alive_session() and not self.lcd.noop():
+            self._logger.warning("LCDd did not answer the health check, reconnecting")
+            self.lcd.close_session( keep_layout = True )
+            self.ensure_screen('OctPriSCR1')
+        self.schedule_health_check()
+
+    def on_timer_result(self):
+        if self.state.result_priority == "alert":
+            self.update_state( result_priority = "info" )
 
     def on_timer_screen(self):
-        self.timer_screen = None
-        self.screen_priority_state = STATE_IDLE
-        self.update_screen_priority()
+        if self.state.priority_state in [ STATE_PRINTING, STATE_PAUSED, ]:
+            return
+        self.clear_alert()
+        self.scheduler.cancel( self.timer_result )
+        if self._settings.get_boolean(["hide_page_when_idle"]):
+            self.update_state( result_priority = "hidden" )
+        if self.backlight:
+            self.backlight.set_state( BACKLIGHT_IDLE )
+        if self.outputs:
+            self.outputs.set( OUTPUT_DONE, False )
+            self.outputs.set( OUTPUT_ERROR, False )
+        self.update_state( priority_state = STATE_IDLE )
+        if self._settings.get_boolean(["hide_page_when_idle"]):
+            self.enter_idle_mode()
+
+    def enter_idle_mode(self):
+        # Between prints nothing is periodic: the ETA timer and connection
+        # retries are dropped, pending one-shot flushes still run. Only
+        # OctoPrint events and LCDd key presses wake the plugin up again.
+        self._logger.debug("Entering idle mode")
+        self.idle_mode = True
+        self.scheduler.cancel( self.timer_seconds )
+        self.scheduler.cancel( self.mark_timers.get( RENDER_CONNECT ) )
+
+    def leave_idle_mode(self):
+        self._logger.debug("Leaving idle mode")
+        self.idle_mode = False
+        if not self.lcd or not self.lcd.alive_session():
+            self.mark_screen( RENDER_CONNECT )
+
+    def return_to_idle_mode(self):
+        # an event which leaves the display idle (an upload, a file change,
+        # a key press on the hidden page) does not end the idle mode
+        if not self.idle_mode and self.state.priority_state == STATE_IDLE and self._settings.get_boolean(["hide_page_when_idle"]):
+            self.enter_idle_mode()
+
+    def on_lcd_key(self, key, timestamp):
+        idle_mode = self.idle_mode
+        if idle_mode:
+            self.leave_idle_mode()
+        self.handle_lcd_key( key, timestamp )
+        if idle_mode:
+            self.return_to_idle_mode()
+
+    def handle_lcd_key(self, key, timestamp):
+        if self.backlight:
+            self.backlight.key_pressed()
+
+        action = self.keypad.handle( key, timestamp ) if self.keypad else None
+        if action is None:
+            return
+
+        if action == ACTION_SCREEN_NEXT:
+            self.select_page( 1 )
+        elif action == ACTION_SCREEN_PREV:
+            self.select_page( -1 )
+        elif action == ACTION_ACKNOWLEDGE:
+            self.acknowledge()
+        elif action == ACTION_PAUSE:
+            if self._printer.is_printing() or self._printer.is_paused():
+                self._printer.toggle_pause_print()
+
+        self._logger.debug("LCDd key '%s' -> %s in %.1f ms" % ( key, action, ( time.monotonic() - timestamp ) * 1000 ) )
+
+    def select_page(self, offset):
+        pages = [ ref for ref in SCREEN_PAGES if self.lcd and ref in self.lcd.screens ]
+        if not pages:
+            return
+        index = pages.index( self.selected_page ) if self.selected_page in pages else 0
+        self.selected_page = pages[ ( index + offset ) % len( pages ) ]
+        self.mark_screen( RENDER_PRIORITY )
+
+    def acknowledge(self):
+        # an alert is acknowledged first, the display returns to what the
+        # printer is doing
+        if self.state.alert:
+            self.clear_alert()
+            return
+
+        # the next acknowledgement only takes the result screen back to
+        # info priority
+        if self.state.result_priority == "alert":
+            self.scheduler.cancel( self.timer_result )
+            self.update_state( result_priority = "info" )
+            return
+
+        # the finished print or the error is acknowledged, no need to wait
+        # for the idle timer
+        if self.state.priority_state in [ STATE_NON_PRINTING, STATE_ERROR, ]:
+            self.cancel_timer_screen()
+            self.notifications.clear()
+            self.refresh_notifications()
+            self.update_state( status = None )
+            self.on_timer_screen()
+
+    def initialize_keypad(self):
+        self.keypad = None
+        if not self._settings.get_boolean(["keys_enabled"]):
+            return
+
+        keypad = Keypad( long_press = self._settings.get_int(["key_long_press_ms"]) / 1000.0 )
+        keypad.bind( self._settings.get(["key_screen_prev"]), ACTION_SCREEN_PREV )
+        keypad.bind( self._settings.get(["key_screen_next"]), ACTION_SCREEN_NEXT )
+        keypad.bind( self._settings.get(["key_acknowledge"]), ACTION_ACKNOWLEDGE )
+        keypad.bind( self._settings.get(["key_pause"]), ACTION_PAUSE, long_press = True )
+
+        for key in keypad.keys():
+            if not self.lcd.add_key( key ):
+                self._logger.warning("Unable to reserve LCDd key '%s'" % key )
+
+        self.keypad = keypad
+        self.lcd.key_handler = self.on_lcd_key
+
+    def initialize_pages(self, state):
+        # adds the enabled optional screens and removes the disabled ones
+        for ref, setting in OPTIONAL_PAGES.items():
+            enabled = self._settings.get_boolean([setting])
+            if not self.lcd.alive_session():
+                # the session was lost on the way, the rest follows the reconnect
+                self.deferred.add( RENDER_PAGES )
+                break
+            if enabled and ref not in self.lcd.screens:
+                screen = self.lcd.add_screen( ref )
+                screen.set_priority( "background" )
+                screen.set_heartbeat( "off" )
+                getattr( self, "initialize_screen_%s" % ref )( screen, state )
+            elif not enabled and ref in self.lcd.screens:
+                self.lcd.del_screen( ref )
+        if self.selected_page not in self.lcd.screens:
+            self.selected_page = SCREEN_PAGES[0]
+
+    def initialize_screen_OctPriRES(self, screen, state):
+        screen.set_priority( "hidden" )
+        screen.set_heartbeat( "off" )
+        screen.add_title_widget("TitleResult", text="")
+        screen.add_string_widget("TextResultTime", text="", x=1, y=2)
+        # below 3 lines the end time goes on the line of the duration
+        if self.lcd_geometry[1] >= 3:
+            screen.add_string_widget("TextResultEnd", text="", x=1, y=3)
+        self.update_screen_TextResult( state )
+
+    def initialize_screen_OctPriJOB(self, screen, state):
+        screen.add_string_widget("TextLayer", text="", x=1, y=1)
+        screen.add_string_widget("TextFilament", text="", x=1, y=2)
+        self.update_screen_TextLayer( state )
+        self.update_screen_TextFilament( state )
+
+    def initialize_screen_OctPriCON(self, screen, state):
+        for index in range( self.lcd_geometry[1] ):
+            screen.add_string_widget("TextConsole%d" % ( index + 1 ), text="", x=1, y=index + 1)
+        self.update_screen_TextConsole( state )
+
+    def initialize_screen_OctPriMETA(self, screen, state):
+        for index in range( min( self.lcd_geometry[1], 3 ) ):
+            screen.add_string_widget("TextMetadata%d" % ( index + 1 ), text="", x=1, y=index + 1)
+        self.update_screen_TextMetadata( state )
+
+    def initialize_screen_OctPriHIST(self, screen, state):
+        for index in range( self.lcd_geometry[1] ):
+            screen.add_string_widget("TextHistory%d" % ( index + 1 ), text="", x=1, y=index + 1)
+        self.update_screen_TextHistory( state )
+
+    def initialize_console(self):
+        if not self._settings.get_boolean(["console_screen_enabled"]):
+            self.console = None
+        elif self.console is None:
+            self.console = ConsoleTail( CONSOLE_LINES )
+
+    def initialize_alerts(self):
+        if not self._settings.get_boolean(["alerts_enabled"]):
+            self.alerts = None
+            return
+        patterns = [ pattern.strip() for pattern in ( self._settings.get(["alert_patterns"]) or "" ).split(",") ]
+        self.alerts = AlertDetector( patterns )
 
     def initialize_lcd(self):
         if not self._settings.get_boolean(["enabled"]):
@@ -258,48 +1445,111 @@ class LcdprocPlugin(octoprint.plugin.SettingsPlugin,
             return False
 
         try:
-            self.lcd = Server(hostname=self._settings.get(["host"]), port=self._settings.get_int(["port"]), debug=False)
+            self.lcd = Server(hostname=self._settings.get(["host"]), port=self._settings.get_int(["port"]), debug=False, timeout=LCDD_TIMEOUT)
+            self.lcd.lost_handler = self.on_lcd_lost
             self.lcd.start_session()
-        except:
+        except Exception as error:
+            if self.lcd:
+                self.lcd.close_session()
             self.lcd = None
-            self._logger.exception("Unable to establish the connection to the LCDd")
-            return False
+            return self.connection_failed( error )
 
-        self.lcd.add_screen("OctPriSCR1")
+        self.connection.succeeded()
+        self.lcd_geometry = ( self.lcd.server_info['screen_width'], self.lcd.server_info['screen_height'] )
+        # everything is built from the current settings
+        self.deferred = set()
 
-        if self._settings.get_boolean(["title_show"]):
-            first_linenum = 2
-            self.lcd.screens['OctPriSCR1'].add_title_widget("TitleText", text = self._settings.get(["title_text"]) )
-            self.lcd.screens['OctPriSCR1'].set_heartbeat("on")
-        else:
-            first_linenum = 1
-            self.lcd.screens['OctPriSCR1'].set_heartbeat("off")
+        self.lcd.add_screen("OctPriSCR1")
+        lines = self.main_screen_lines( self.update_screen_title( self.lcd.screens['OctPriSCR1'] ) )
 
-        self.update_screen_priority()
+        state = self.state
+        self.lcd.add_screen("OctPriRES")
+        self.initialize_screen_OctPriRES( self.lcd.screens['OctPriRES'], state )
+        self.initialize_pages( state )
+        self.update_screen_priority( state )
+        self.initialize_keypad()
+        self.initialize_outputs()
+        self.initialize_backlight()
+        self.initialize_health_check()
 
-        self.lcd.screens['OctPriSCR1'].add_string_widget("TextPercent", text="", y= first_linenum+0, x=self.lcd.server_info['screen_width']-3 )
-        self.lcd.screens['OctPriSCR1'].add_scroller_widget("TextFileName", text="", speed=5, left=1, top=first_linenum+0, right=self.lcd.server_info['screen_width']-5, bottom=first_linenum+0 )
-        self.lcd.screens['OctPriSCR1'].add_string_widget("TextETA", text="", y=first_linenum+1,x=2,)
-        self.lcd.screens['OctPriSCR1'].add_string_widget("TextFIN", text="", y=first_linenum+1,x=self.lcd.server_info['screen_width']-2)
-        self.lcd.screens['OctPriSCR1'].add_icon_widget("IconETA", x=1, y=first_linenum+1, name="SELECTOR_AT_RIGHT" )
-        self.lcd.screens['OctPriSCR1'].add_icon_widget("IconFIN", x=self.lcd.server_info['screen_width'], y=first_linenum+1, name="SELECTOR_AT_LEFT" )
+        self.lcd.screens['OctPriSCR1'].add_string_widget("TextPercent", text="", y=lines['TextPercent'], x=self.lcd.server_info['screen_width']-3 )
+        self.lcd.screens['OctPriSCR1'].add_scroller_widget("TextFileName", text="", speed=5, left=1, top=lines['TextFileName'], right=self.lcd.server_info['screen_width']-5, bottom=lines['TextFileName'] )
+        self.lcd.screens['OctPriSCR1'].add_string_widget("TextETA", text="", y=lines['TextETA'],x=2,)
+        self.lcd.screens['OctPriSCR1'].add_string_widget("TextFIN", text="", y=lines['TextFIN'],x=self.lcd.server_info['screen_width']-2)
+        self.lcd.screens['OctPriSCR1'].add_icon_widget("IconETA", x=1, y=lines['IconETA'], name="SELECTOR_AT_RIGHT" )
+        self.lcd.screens['OctPriSCR1'].add_scroller_widget("TextMessage", text="", speed=5, left=1, top=lines['TextMessage'], right=self.message_right(), bottom=lines['TextMessage'] )
+        self.lcd.screens['OctPriSCR1'].add_icon_widget("IconFIN", x=self.lcd.server_info['screen_width'], y=lines['IconFIN'], name="SELECTOR_AT_LEFT" )
 
         self._logger.info("LCDd connection established")
 
-        self.update_screen_TextFileName()
-        self.update_screen_TextPercent()
-        self.update_screen_TextETA()
-        self.update_screen_TextFIN()
+        self.update_screen_TextFileName( state )
+        self.update_screen_TextPercent( state )
+        self.update_screen_TextETA( state )
+        self.update_screen_TextFIN( state )
+        self.update_screen_TextMessage( state )
+        self.rendered_state = state
 
         return True
 
+    def connect_lcd(self):
+        if not self.connection.allow( time.monotonic() ):
+            return False
+
+        if self.lcd and self.lcd.screens:
+            # the layout of the lost session is still known, replay it
+            try:
+                self.lcd.restore_session()
+            except Exception as error:
+                self.lcd.close_session( keep_layout = True )
+                return self.connection_failed( error )
+
+            if self.lcd.alive_session() and ( self.lcd.server_info['screen_width'], self.lcd.server_info['screen_height'] ) == self.lcd_geometry:
+                failures = self.connection.succeeded()
+                self._logger.info("LCDd connection restored after %d failed attempt(s)" % failures )
+                self.outputs.reset()
+                self.backlight.reset()
+                self.schedule_health_check()
+                self.mark_deferred()
+                return True
+
+            # a different display, the layout has to be rebuilt
+            self.lcd.close_session()
+            self.lcd = None
+
+        return self.initialize_lcd()
+
+    def connection_failed(self, error):
+        delay = self.connection.failed( time.monotonic() )
+        if self.connection.failures == 1:
+            self._logger.warning("Unable to establish the connection to the LCDd (%s), retrying with backoff" % error )
+        else:
+            self._logger.debug("LCDd is still unreachable (%s), next attempt in %.1f s" % ( error, delay ) )
+        if not self.idle_mode:
+            self.mark_later( RENDER_CONNECT, delay )
+        return False
+
+    def ensure_live_session(self, item):
+        # Changes of the layout itself (keys, screens) need LCDd, the cached
+        # layout cannot take them. While LCDd is unreachable they are
+        # deferred and rendered again after the reconnect.
+        self.ensure_screen('OctPriSCR1')
+        if self.lcd and self.lcd.alive_session():
+            return True
+        self.deferred.add( item )
+        return False
+
+    def mark_deferred(self):
+        deferred, self.deferred = self.deferred, set()
+        self.mark_screen( *deferred )
+
     def ensure_screen(self, ref):
+        # While LCDd is unreachable the screen of the lost session is returned,
+        # updates go to its cached widgets and get replayed on reconnect.
         if not self.lcd or not self.lcd.alive_session():
-            if not self.initialize_lcd():
-                return ( None, None, None )
+            self.connect_lcd()
 
-        if self.lcd and self.lcd.alive_session() and ref in self.lcd.screens:
-            return ( self.lcd.screens[ref], self.lcd.server_info['screen_width'], self.lcd.server_info['screen_height'] )
+        if self.lcd and ref in self.lcd.screens:
+            return ( self.lcd.screens[ref], self.lcd_geometry[0], self.lcd_geometry[1] )
 
         return ( None, None, None )
 
@@ -314,5 +1564,7 @@ def __plugin_load__():
 
     global __plugin_hooks__
     __plugin_hooks__ = {
-        "octoprint.plugin.softwareupdate.check_config": __plugin_implementation__.get_update_information
+        "octoprint.plugin.softwareupdate.check_config": __plugin_implementation__.get_update_information,
+        "octoprint.comm.protocol.gcode.sent": __plugin_implementation__.on_gcode_sent,
+        "octoprint.comm.protocol.gcode.received": __plugin_implementation__.on_gcode_received,
     }
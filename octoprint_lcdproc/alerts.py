@@ -0,0 +1,34 @@
+# coding=utf-8
+from __future__ import absolute_import
+import re
+
+# firmware messages which are always worth an alert
+ALERT_PATTERNS = [ "Error:", "!!", "Thermal Runaway", "THERMAL RUNAWAY", "MINTEMP", "MAXTEMP", "Heating failed", "Printer halted", ]
+
+# errors which only ask for a resend, OctoPrint handles them
+ALERT_IGNORED = re.compile("checksum mismatch|Line Number is not|No Line Number|Missing checksum|No Checksum", re.IGNORECASE)
+
+class AlertDetector(object):
+
+    """
+    Finds firmware alerts in received lines
+
+    All patterns are literal strings compiled into one case sensitive
+    alternation (ignoring the case would make every line several times
+    slower), so a line is scanned once whatever the number of patterns.
+    Resend requests reported as errors are only checked for lines which
+    matched.
+    """
+
+    def __init__(self, patterns):
+        patterns = [ pattern for pattern in patterns if pattern ]
+        self.matcher = re.compile("|".join(re.escape(pattern) for pattern in patterns)) if patterns else None
+
+    def match(self, line):
+        """ Returns the matching pattern, None if the line is no alert """
+        if self.matcher is None:
+            return None
+        found = self.matcher.search(line)
+        if found is None or ALERT_IGNORED.search(line):
+            return None
+        return found.group(0)
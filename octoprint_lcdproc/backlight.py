@@ -0,0 +1,123 @@
+# coding=utf-8
+from __future__ import absolute_import
+import threading
+import time
+
+BACKLIGHT_PRINTING = "printing"
+BACKLIGHT_PAUSED = "paused"
+BACKLIGHT_FAILED = "failed"
+BACKLIGHT_DONE = "done"
+BACKLIGHT_IDLE = "idle"
+BACKLIGHT_CONNECTED = "connected"
+BACKLIGHT_DISCONNECTED = "disconnected"
+BACKLIGHT_ALERT = "alert"
+
+BACKLIGHT_STATES = [ BACKLIGHT_PRINTING, BACKLIGHT_PAUSED, BACKLIGHT_FAILED, BACKLIGHT_DONE, BACKLIGHT_IDLE, BACKLIGHT_CONNECTED, BACKLIGHT_DISCONNECTED, BACKLIGHT_ALERT, ]
+
+class Backlight(object):
+
+    """
+    Backlight policy
+
+    The wanted backlight mode comes from the current state, and a key press
+    turns the backlight on for `key_seconds`. An alert overrides both until
+    it is cleared. Every screen which can be visible gets the same mode, LCDd
+    only shows the backlight of the visible one. Commands are debounced per
+    screen: a screen gets at most one `backlight` command per `interval`
+    seconds, the mode wanted at the end of the interval is sent, and only if
+    it differs from what the screen already has. Flushing is requested from
+    the owner with `wake(delay)`, which has to call flush() after `delay`
+    seconds.
+    """
+
+    def __init__(self, write, wake, interval=2.0, key_seconds=30.0, key_mode="on"):
+        self.write = write
+        self.wake = wake
+        self.interval = interval
+        self.key_seconds = key_seconds
+        self.key_mode = key_mode
+        self.modes = dict()
+        self.screens = list()
+        self.state = None
+        self.alert = False
+        self.key_until = 0
+        self.written = dict()
+        self.last_write = dict()
+        self.lock = threading.Lock()
+
+    def set_mode(self, state, mode):
+        with self.lock:
+            self.modes[state] = mode
+        self.schedule(0)
+
+    def set_screens(self, screens):
+        with self.lock:
+            self.screens = list(screens)
+        self.schedule(0)
+
+    def set_state(self, state):
+        with self.lock:
+            if state == self.state:
+                return
+            self.state = state
+        self.schedule(0)
+
+    def set_alert(self, alert):
+        """ The alert mode overrides the state until cleared, it is switched on without debouncing """
+        with self.lock:
+            if alert == self.alert:
+                return
+            self.alert = alert
+            if alert:
+                self.last_write = dict()
+        self.schedule(0)
+
+    def key_pressed(self):
+        with self.lock:
+            self.key_until = time.monotonic() + self.key_seconds
+        self.schedule(0)
+
+    def reset(self):
+        """ Forget what was sent, e.g. after a reconnect """
+        with self.lock:
+            self.written = dict()
+            self.last_write = dict()
+        self.schedule(0)
+
+    def wanted(self, now):
+        if self.alert and self.modes.get(BACKLIGHT_ALERT):
+            return self.modes[BACKLIGHT_ALERT]
+        if now < self.key_until:
+            return self.key_mode
+        return self.modes.get(self.state)
+
+    def schedule(self, delay):
+        self.wake(delay)
+
+    def flush(self):
+        now = time.monotonic()
+        changes = list()
+        retry = None
+        with self.lock:
+            mode = self.wanted(now)
+            for ref in self.screens:
+                if mode is None or mode == self.written.get(ref):
+                    continue
+                wait = self.last_write.get(ref, now - self.interval) + self.interval - now
+                if wait > 0:
+                    retry = wait if retry is None else min(retry, wait)
+                    continue
+                changes.append(( ref, mode ))
+                self.last_write[ref] = now
+            if self.key_until > now:
+                # come back when the key press override expires
+                wait = self.key_until - now
+                retry = wait if retry is None else min(retry, wait)
+
+        for ref, mode in changes:
+            if self.write(ref, mode):
+                with self.lock:
+                    self.written[ref] = mode
+
+        if retry is not None:
+            self.schedule(retry)
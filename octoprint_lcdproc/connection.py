@@ -0,0 +1,55 @@
+# coding=utf-8
+from __future__ import absolute_import
+import random
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+class ConnectionManager(object):
+
+    """
+    Decides when connecting to LCDd is worth a try
+
+    closed: connected, or no failure yet, attempts are allowed
+    open: the last attempt failed, nothing is tried until the retry time
+    half_open: the retry time passed, one attempt is running
+
+    The retry delay doubles with each consecutive failure up to `maximum`,
+    with +/- `jitter` randomization so several clients do not retry in step.
+    """
+
+    def __init__(self, initial=1.0, maximum=300.0, factor=2.0, jitter=0.2):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self.state = CIRCUIT_CLOSED
+        self.failures = 0
+        self.retry_at = 0
+
+    def allow(self, now):
+        if self.state == CIRCUIT_OPEN:
+            if now < self.retry_at:
+                return False
+            self.state = CIRCUIT_HALF_OPEN
+        return True
+
+    def failed(self, now):
+        """ Records a failed attempt, returns the delay until the next one """
+        self.failures += 1
+        delay = min(self.maximum, self.initial * self.factor ** (self.failures - 1))
+        delay *= 1 + random.uniform(-self.jitter, self.jitter)
+        self.retry_at = now + delay
+        self.state = CIRCUIT_OPEN
+        return delay
+
+    def succeeded(self):
+        """ Records a successful attempt, returns the number of failures before it """
+        failures = self.failures
+        self.failures = 0
+        self.state = CIRCUIT_CLOSED
+        return failures
+
+    def reset(self):
+        self.succeeded()
@@ -0,0 +1,39 @@
+# coding=utf-8
+from __future__ import absolute_import
+import threading
+
+# received lines which are not worth showing: acknowledgements, temperature
+# reports and busy notifications
+CONSOLE_SKIP_PREFIXES = ( "ok", "T:", " T:", "B:", "wait", )
+
+class ConsoleTail(object):
+
+    """
+    The last lines received from the printer
+
+    A fixed size ring buffer: add() stores the reference to the line in the
+    next slot and advances the position, so receiving a line allocates
+    nothing. Skipped lines are filtered with a single startswith() call.
+    """
+
+    def __init__(self, size=8):
+        self.size = size
+        self.buffer = [ None ] * size
+        self.position = 0
+        self.lock = threading.Lock()
+
+    def add(self, line):
+        """ Returns False if the line was skipped """
+        if not line or line.startswith(CONSOLE_SKIP_PREFIXES):
+            return False
+        with self.lock:
+            self.buffer[self.position] = line
+            self.position = ( self.position + 1 ) % self.size
+        return True
+
+    def lines(self, count):
+        """ The last count lines, oldest first """
+        count = min(count, self.size)
+        with self.lock:
+            lines = [ self.buffer[( self.position - count + i ) % self.size] for i in range(count) ]
+        return [ line for line in lines if line is not None ]
@@ -0,0 +1,128 @@
+# coding=utf-8
+from __future__ import absolute_import
+import json
+import os
+import threading
+
+# how many previous prints make the history fully trusted
+HISTORY_FULL_WEIGHT_COUNT = 3
+
+class DurationStore(object):
+
+    """
+    Durations of previous prints, keyed by file hash
+
+    Stored as a JSON object of `hash: [count, mean seconds]` pairs. The file is
+    read on first use only, and rewritten (atomically) when a print is added.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        with self.lock:
+            if self.entries is not None:
+                return
+            try:
+                with open(self.path) as f:
+                    self.entries = json.load(f)
+            except (IOError, OSError, ValueError):
+                self.entries = dict()
+
+    def get(self, key):
+        """ Returns ( count, mean duration ) or None """
+        self.load()
+        entry = self.entries.get(key)
+        return tuple(entry) if entry else None
+
+    def add(self, key, duration):
+        self.load()
+        with self.lock:
+            count, mean = self.entries.get(key, ( 0, 0 ))
+            count += 1
+            mean += ( duration - mean ) / count
+            self.entries[key] = [ count, int(mean) ]
+
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w") as f:
+                json.dump(self.entries, f, separators=(",", ":"))
+            os.replace(temp_path, self.path)
+
+class EtaEstimator(object):
+
+    """
+    Blends three estimates of the remaining print time
+
+    - OctoPrint's printTimeLeft, constant weight
+    - the progress rate so far, weighted by the completion; time spent
+      paused does not count
+    - the mean duration of previous prints of the file, weighted by the
+      missing completion and by how many prints it is based on
+
+    Every update() is O(1).
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.started = None
+        self.paused_since = None
+        self.paused = 0.0
+        self.expected = None
+        self.expected_weight = 0
+
+    def start(self, key, now):
+        self.started = now
+        self.paused_since = None
+        self.paused = 0.0
+        self.expected = None
+        self.expected_weight = 0
+        entry = self.store.get(key) if key else None
+        if entry:
+            count, mean = entry
+            self.expected = mean
+            self.expected_weight = min(count, HISTORY_FULL_WEIGHT_COUNT) / float(HISTORY_FULL_WEIGHT_COUNT)
+
+    def stop(self):
+        self.started = None
+
+    def pause(self, now):
+        if self.started is not None and self.paused_since is None:
+            self.paused_since = now
+
+    def resume(self, now):
+        if self.paused_since is not None:
+            self.paused += now - self.paused_since
+            self.paused_since = None
+
+    def elapsed(self, now):
+        """ Seconds printed since the start, without the pauses """
+        if self.paused_since is not None:
+            now = self.paused_since
+        return now - self.started - self.paused
+
+    def update(self, now, completion, print_time_left):
+        if self.started is None:
+            return print_time_left
+
+        elapsed = self.elapsed(now)
+        done = min(max(( completion or 0 ) / 100.0, 0), 1)
+
+        total = 0.0
+        weight = 0.0
+        if print_time_left is not None:
+            total += print_time_left
+            weight += 1.0
+        if done > 0:
+            rate_weight = 2.0 * done
+            total += rate_weight * elapsed * ( 1 - done ) / done
+            weight += rate_weight
+        if self.expected is not None:
+            history_weight = 2.0 * ( 1 - done ) * self.expected_weight
+            total += history_weight * max(self.expected - elapsed, 0)
+            weight += history_weight
+
+        if weight == 0:
+            return None
+        return int(total / weight)
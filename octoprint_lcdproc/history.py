@@ -0,0 +1,109 @@
+# coding=utf-8
+from __future__ import absolute_import
+from collections import deque, namedtuple
+import json
+import os
+import threading
+
+HISTORY_DONE = "done"
+HISTORY_FAILED = "failed"
+HISTORY_CANCELLED = "cancelled"
+
+# bytes read from the end of the log to find the most recent jobs
+HISTORY_TAIL_BYTES = 4096
+
+HistoryEntry = namedtuple( 'HistoryEntry', [ 'finished', 'name', 'duration', 'result', ] )
+
+class PrintHistory(object):
+
+    """
+    Finished prints and their cumulative statistics
+
+    Every print is appended as one JSON line to `<path>.log`, the totals
+    (count, successful prints, seconds printed) are kept up to date in
+    `<path>.json`, rewritten atomically on each print. Loading reads the
+    totals and the end of the log only, the log is scanned completely only
+    when the totals are missing. Everything is loaded on first use.
+    """
+
+    def __init__(self, path, recent=3):
+        self.log_path = path + ".log"
+        self.totals_path = path + ".json"
+        self.entries = deque(maxlen=recent)
+        self.totals = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        with self.lock:
+            if self.totals is not None:
+                return
+            try:
+                with open(self.totals_path) as f:
+                    self.totals = json.load(f)
+            except (IOError, OSError, ValueError):
+                self.totals = self.rebuild_totals()
+            self.entries.extend(self.read_tail())
+
+    def read_tail(self):
+        try:
+            with open(self.log_path, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                start = max(f.tell() - HISTORY_TAIL_BYTES, 0)
+                f.seek(start)
+                lines = f.read().decode("utf-8", "replace").splitlines()
+        except (IOError, OSError):
+            return []
+        if start > 0:
+            # the first line is most probably cut
+            lines = lines[1:]
+        return [ entry for entry in map(self.parse, lines[-self.entries.maxlen:]) if entry ]
+
+    def rebuild_totals(self):
+        totals = { "count": 0, "done": 0, "seconds": 0 }
+        try:
+            with open(self.log_path, encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    entry = self.parse(line)
+                    if entry:
+                        self.count(totals, entry)
+        except (IOError, OSError):
+            pass
+        return totals
+
+    def parse(self, line):
+        try:
+            return HistoryEntry(*json.loads(line))
+        except (ValueError, TypeError):
+            return None
+
+    def count(self, totals, entry):
+        totals["count"] += 1
+        totals["seconds"] += entry.duration
+        if entry.result == HISTORY_DONE:
+            totals["done"] += 1
+
+    def add(self, finished, name, duration, result):
+        self.load()
+        entry = HistoryEntry(int(finished), name, int(duration or 0), result)
+        with self.lock:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(list(entry), separators=(",", ":")) + "\n")
+            self.entries.append(entry)
+            self.count(self.totals, entry)
+
+            temp_path = self.totals_path + ".tmp"
+            with open(temp_path, "w") as f:
+                json.dump(self.totals, f, separators=(",", ":"))
+            os.replace(temp_path, self.totals_path)
+
+    def recent(self):
+        """ The last prints, most recent first """
+        self.load()
+        with self.lock:
+            return list(reversed(self.entries))
+
+    def statistics(self):
+        """ ( prints, successful prints, seconds printed ) """
+        self.load()
+        with self.lock:
+            return ( self.totals["count"], self.totals["done"], self.totals["seconds"] )
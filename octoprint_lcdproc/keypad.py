@@ -0,0 +1,54 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+ACTION_SCREEN_NEXT = "screen_next"
+ACTION_SCREEN_PREV = "screen_prev"
+ACTION_ACKNOWLEDGE = "acknowledge"
+ACTION_PAUSE = "pause"
+
+class Keypad(object):
+
+    """
+    Translates LCDd key events to plugin actions
+
+    LCDd only reports key presses, a held key is reported again and again by
+    the driver's auto-repeat. A press sequence is the run of events of the same
+    key with less than `repeat_gap` seconds between them; short bindings fire
+    on the first event of a sequence, long bindings once the sequence lasted
+    `long_press` seconds.
+    """
+
+    def __init__(self, long_press=1.0, repeat_gap=0.3):
+        self.long_press = long_press
+        self.repeat_gap = repeat_gap
+        self.short_bindings = dict()
+        self.long_bindings = dict()
+        self.key = None
+        self.pressed_since = None
+        self.last_seen = None
+        self.long_fired = False
+
+    def bind(self, key, action, long_press=False):
+        if not key:
+            return
+        if long_press:
+            self.long_bindings[key] = action
+        else:
+            self.short_bindings[key] = action
+
+    def keys(self):
+        return set(self.short_bindings) | set(self.long_bindings)
+
+    def handle(self, key, timestamp):
+        if key != self.key or timestamp - self.last_seen > self.repeat_gap:
+            self.key = key
+            self.pressed_since = timestamp
+            self.last_seen = timestamp
+            self.long_fired = False
+            return self.short_bindings.get(key)
+
+        self.last_seen = timestamp
+        if not self.long_fired and key in self.long_bindings and timestamp - self.pressed_since >= self.long_press:
+            self.long_fired = True
+            return self.long_bindings[key]
+        return None
@@ -217,6 +217,26 @@ class Screen(object):
         
                                             
 
+    def commands(self):
+
+        """ Commands recreating the screen, its settings and widgets """
+
+        commands = ["screen_add %s" % (self.ref)]
+        if self.name != self.ref:
+            commands.append("screen_set %s name %s" % (self.ref, self.name))
+        for key, value in [("wid", self.width), ("hgt", self.height),
+                           ("cursor_x", self.cursor_x), ("cursor_y", self.cursor_y),
+                           ("duration", self.duration and self.duration * 8),
+                           ("timeout", self.timeout and self.timeout * 8),
+                           ("priority", self.priority), ("backlight", self.backlight),
+                           ("heartbeat", self.heartbeat), ("cursor", self.cursor)]:
+            if value is not None:
+                commands.append("screen_set %s %s %s" % (self.ref, key, value))
+        for widget in self.widgets.values():
+            commands.extend(widget.commands())
+        return commands
+
+
     def del_widget(self, ref):
         """ Delete/Remove A Widget """
         self.server.request("widget_del %s %s" % (self.name, ref))
@@ -1,6 +1,11 @@
 from __future__ import print_function
 from urllib.parse import unquote
+import queue
 import select
+import socket
+import threading
+import time
+import traceback
 
 from .screen import Screen
 from .pytelnetlib import telnetlib
@@ -9,25 +14,55 @@ class Server(object):
     
     """ LCDproc Server Object """
     
-    def __init__(self, hostname="localhost", port=13666, debug=False):
+    def __init__(self, hostname="localhost", port=13666, debug=False, timeout=None):
         
-        """ Constructor """
+        """
+        Constructor
+
+        timeout (seconds) bounds connecting and waiting for a reply, a request
+        without reply in time closes the session. None waits forever.
+        """
         
         self.debug = debug
         self.hostname = hostname
         self.port = port
+        self.timeout = timeout
         self.tn = None
         self.server_info = dict()
         self.screens = dict()
         self.keys = list()
+        self.key_modes = dict()
+        self.key_handler = None
+        self.lost_handler = None
+        self.visible_screen = None
+        self.lock = threading.Lock()
+        self.responses = None
+        self.last_activity = time.monotonic()
+        self.keepalive_idle = None
                 
     def start_session(self):
         
         """ Start Session """
 
-        self.tn = telnetlib.Telnet(self.hostname, self.port)
+        if self.timeout is None:
+            self.tn = telnetlib.Telnet(self.hostname, self.port)
+        else:
+            self.tn = telnetlib.Telnet(self.hostname, self.port, self.timeout)
+        self.responses = queue.Queue()
+        events = queue.Queue()
+        self.last_activity = time.monotonic()
+        self.apply_keepalive()
+
+        # LCDd sends key, menu and visibility notifications at any time, so a
+        # dedicated thread blocks on the socket and sorts replies from events.
+        # Events are handed to a second thread, because handlers usually issue
+        # requests of their own, which would deadlock the reader.
+        threading.Thread(target=self.reader, args=(self.tn, self.responses, events), name="LCDd reader", daemon=True).start()
+        threading.Thread(target=self.dispatcher, args=(events,), name="LCDd events", daemon=True).start()
         
         response = self.request("hello") 
+        if not response:
+            raise IOError("no reply from LCDd to hello")
         bits = response.split(" ")
         self.server_info.update({
             "server_version": bits[2],
@@ -39,13 +74,50 @@ class Server(object):
         })                
         return response  
 
-    def close_session(self):
+    def restore_session(self):
+
+        """
+        Restore Session
+
+        Starts a new session and recreates the screens, widgets and keys kept
+        from the previous one with a single batch of requests.
+        """
+
         if self.tn:
-            self.tn.close()
-        self.tn = None
+            self.close_session(keep_layout=True)
+        response = self.start_session()
+        commands = list()
+        for screen in self.screens.values():
+            commands.extend(screen.commands())
+        for ref in self.keys:
+            commands.append("client_add_key -%s %s" % (self.key_modes.get(ref, "shared"), ref))
+        self.request_batch(commands)
+        return response
+
+    def close_session(self, keep_layout=False):
+
+        """
+        Close Session
+
+        With keep_layout the screens, widgets and keys are kept, so that
+        restore_session() can bring them back.
+        """
+
+        # the reader thread may close the session concurrently
+        tn, self.tn = self.tn, None
+        if tn:
+            try:
+                # wakes up the reader thread blocked in select()
+                tn.get_socket().shutdown(socket.SHUT_RDWR)
+            except:
+                pass
+            tn.close()
         self.server_info = dict()
-        self.screens = dict()
-        self.keys = list()
+        self.visible_screen = None
+        if not keep_layout:
+            self.screens = dict()
+            self.keys = list()
+            self.key_modes = dict()
 
     def alive_session(self):
         if not self.tn:
@@ -59,29 +131,125 @@ class Server(object):
         """ Request """
         if not self.tn:
             return
+        with self.lock:
+            responses = self.responses
+            try:
+                self.tn.write((command_string + "\n").encode())
+            except:
+                self.close_session(keep_layout=True)
+                return None
+
+            if self.debug: print("Telnet Request:", command_string)
+            response = self.wait_response(responses)
+
+        if response is None:            # Connection lost
+            self.close_session(keep_layout=True)
+            return None
+        if "huh" in response or self.debug: print("Telnet Response:", response[:-1])
+        return response
+
+    def request_batch(self, command_strings):
+
+        """
+        Request Batch
+
+        Sends all commands in one write and collects the responses afterwards,
+        so a batch costs a single round trip. Returns the list of responses,
+        or None when the connection was lost.
+        """
+
+        if not self.tn or not command_strings:
+            return
+        with self.lock:
+            responses = self.responses
+            try:
+                self.tn.write("".join(command + "\n" for command in command_strings).encode())
+            except:
+                self.close_session(keep_layout=True)
+                return None
+
+            if self.debug: print("Telnet Batch:", len(command_strings), "requests")
+            results = list()
+            for command in command_strings:
+                response = self.wait_response(responses)
+                if response is None:
+                    break
+                if "huh" in response or self.debug: print("Telnet Response:", command, "->", response[:-1])
+                results.append(response)
+
+        if len(results) < len(command_strings):
+            self.close_session(keep_layout=True)
+            return None
+        return results
+
+    def wait_response(self, responses):
         try:
-            self.tn.write((command_string + "\n").encode())
-        except:
-            self.close_session()
+            return responses.get(timeout=self.timeout)
+        except queue.Empty:
+            if self.debug: print("Telnet Timeout")
             return None
 
-        if self.debug: print("Telnet Request:", command_string)
+    def reader(self, tn, responses, events):
+
+        """
+        Reader thread
+
+        Blocks on the socket and routes every line sent by LCDd: replies
+        (success, huh, connect) go to the pending request, key presses are
+        queued for the dispatcher, visibility notifications are tracked.
+        When LCDd closes the connection the session is closed right away,
+        keeping the layout, and the dispatcher reports the loss.
+        """
+
         while True:
             try:
-                response = unquote(self.tn.read_until(b"\n").decode())
+                line = tn.read_until(b"\n")
             except:
-                self.close_session()
-                return None
-            if "success" in response:   # Normal successful reply
-                break
-            if "huh" in response:       # Something went wrong
-                break
-            if "connect" in response:   # Special reply to "hello"
-                break
-            # TODO Keep track of which screen is displayed
-            # Try again if response was key, menu or visibility notification.
-        if "huh" in response or self.debug: print("Telnet Response:", response[:-1])
-        return response
+                line = b""
+            if not line.endswith(b"\n"):   # EOF or closed socket
+                responses.put(None)
+                if self.tn is tn:           # not closed by close_session()
+                    self.close_session(keep_layout=True)
+                    events.put(("lost", None, time.monotonic()))
+                events.put(None)
+                return
+
+            self.last_activity = time.monotonic()
+            response = unquote(line.decode())
+            if response.startswith("key "):
+                events.put(("key", response[4:].strip(), time.monotonic()))
+            elif response.startswith("listen "):
+                self.visible_screen = response[7:].strip()
+            elif response.startswith("ignore "):
+                if self.visible_screen == response[7:].strip():
+                    self.visible_screen = None
+            elif response.startswith("menuevent "):
+                pass
+            else:
+                responses.put(response)
+
+    def dispatcher(self, events):
+
+        """
+        Event dispatcher thread
+
+        Calls key_handler(key, timestamp) for every key event, timestamp is
+        the time.monotonic() value of the moment the reader received it, and
+        lost_handler() when LCDd closed the connection.
+        """
+
+        while True:
+            event = events.get()
+            if event is None:
+                return
+            kind, value, timestamp = event
+            try:
+                if kind == "key" and self.key_handler:
+                    self.key_handler(value, timestamp)
+                elif kind == "lost" and self.lost_handler:
+                    self.lost_handler()
+            except:
+                if self.debug: traceback.print_exc()
 
 
     # def poll(self):
@@ -140,8 +308,9 @@ class Server(object):
 
         if ref not in self.keys:   
             response = self.request("client_add_key -%s %s" % (mode, ref))
-            if "success" not in response: return None
+            if not response or "success" not in response: return None
             self.keys.append(ref)
+            self.key_modes[ref] = mode
             return ref
 
 
@@ -156,10 +325,11 @@ class Server(object):
         if not self.tn:
             return
 
-        if ref not in self.keys:   
+        if ref in self.keys:   
             response = self.request("client_del_key %s" % (ref))
             self.keys.remove(ref)
-            if "success" in response:
+            self.key_modes.pop(ref, None)
+            if response and "success" in response:
                 return None
             else:
                 return response
@@ -180,11 +350,43 @@ class Server(object):
         if not self.tn:
             return
 
-        response = self.request(("output %s" % (value)).encode())
-        if "success" in response:
+        response = self.request("output %s" % (value))
+        if response and "success" in response:
             return None
         else:
-            return response
+            return response or "no response"
+
+    def noop(self):
+        """
+        Noop
+
+        Cheapest round trip to LCDd, returns True if it answered.
+        """
+
+        response = self.request("noop")
+        return bool(response) and "noop complete" in response
+
+    def set_keepalive(self, idle):
+        """
+        Enables TCP keepalive probes after idle seconds without traffic for
+        this and every later session, None disables them.
+        """
+
+        self.keepalive_idle = idle
+        self.apply_keepalive()
+
+    def apply_keepalive(self):
+        if not self.tn:
+            return
+        sock = self.tn.get_socket()
+        if self.keepalive_idle is None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 0)
+            return
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        # the fine tuning is not available on every platform
+        for option, value in [("TCP_KEEPIDLE", int(self.keepalive_idle)), ("TCP_KEEPINTVL", max(int(self.keepalive_idle) // 4, 1)), ("TCP_KEEPCNT", 3)]:
+            if hasattr(socket, option):
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
 
     def get_server_info(self):
         """
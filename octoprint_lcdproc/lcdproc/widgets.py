@@ -1,7 +1,22 @@
-class StringWidget(object):
+class Widget(object):
+
+    """ Widget base, knows the commands which (re)create it """
+
+    type = None
+
+    def add_command(self):
+        return "widget_add %s %s %s" % (self.screen.ref, self.ref, self.type)
+
+    def commands(self):
+        return [self.add_command(), self.set_command()]
+
+
+class StringWidget(Widget):
 
     """ String Widget """
 
+    type = "string"
+
     def __init__(self, screen, ref, x, y, text):
         
         self.screen = screen
@@ -10,12 +25,15 @@ class StringWidget(object):
         self.y = y
         self.text = text
 
-        self.screen.server.request("widget_add %s %s %s" % (self.screen.ref, self.ref, "string"))
+        self.screen.server.request(self.add_command())
         self.update()
 
     
     def update(self):
-        self.screen.server.request('widget_set %s %s %s %s "%s"' % (self.screen.ref, self.ref, self.x, self.y, self.text))
+        self.screen.server.request(self.set_command())
+
+    def set_command(self):
+        return 'widget_set %s %s %s %s "%s"' % (self.screen.ref, self.ref, self.x, self.y, self.text)
 
     
     def set_x(self, x):
@@ -30,9 +48,11 @@ class StringWidget(object):
         self.text = text
         
         
-class TitleWidget(object):
+class TitleWidget(Widget):
     
     """ Title Widget """
+
+    type = "title"
     
     def __init__(self, screen, ref, text):
         
@@ -40,17 +60,22 @@ class TitleWidget(object):
         self.ref = ref
         self.text = text
 
-        self.screen.server.request("widget_add %s %s %s" % (self.screen.ref, self.ref, "title"))
+        self.screen.server.request(self.add_command())
         self.update()
         
     def update(self):
-        self.screen.server.request('widget_set %s %s "%s"' % (self.screen.ref, self.ref, self.text))
+        self.screen.server.request(self.set_command())
+
+    def set_command(self):
+        return 'widget_set %s %s "%s"' % (self.screen.ref, self.ref, self.text)
 
     def set_text(self, text):
         self.text = text
         
         
-class HBarWidget(object):
+class HBarWidget(Widget):
+
+    type = "hbar"
     
     def __init__(self, screen, ref, x, y, length):
         
@@ -60,12 +85,16 @@ class HBarWidget(object):
         self.y = y
         self.length = length
 
-        self.screen.server.request("widget_add %s %s %s" % (self.screen.ref, self.ref, "hbar"))
+        self.screen.server.request(self.add_command())
         self.update()
         
     def update(self):
         
-        self.screen.server.request("widget_set %s %s %s %s %s" % (self.screen.ref, self.ref, self.x, self.y, self.length))
+        self.screen.server.request(self.set_command())
+
+    def set_command(self):
+
+        return "widget_set %s %s %s %s %s" % (self.screen.ref, self.ref, self.x, self.y, self.length)
 
     def set_x(self, x):
         
@@ -80,7 +109,9 @@ class HBarWidget(object):
         self.length = length
         
                                       
-class VBarWidget(object):
+class VBarWidget(Widget):
+
+    type = "vbar"
     
     def __init__(self, screen, ref, x, y, length):
         
@@ -90,12 +121,16 @@ class VBarWidget(object):
         self.y = y
         self.length = length
 
-        self.screen.server.request("widget_add %s %s %s" % (self.screen.ref, self.ref, "vbar"))
+        self.screen.server.request(self.add_command())
         self.update()
         
     def update(self):
         
-        self.screen.server.request("widget_set %s %s %s %s %s" % (self.screen.ref, self.ref, self.x, self.y, self.length))
+        self.screen.server.request(self.set_command())
+
+    def set_command(self):
+
+        return "widget_set %s %s %s %s %s" % (self.screen.ref, self.ref, self.x, self.y, self.length)
 
     def set_x(self, x):
         
@@ -110,7 +145,9 @@ class VBarWidget(object):
         self.length = length
         
         
-class IconWidget(object):
+class IconWidget(Widget):
+
+    type = "icon"
     
     def __init__(self, screen, ref, x, y, name):
         
@@ -120,12 +157,16 @@ class IconWidget(object):
         self.y = y
         self.name = name
 
-        self.screen.server.request("widget_add %s %s %s" % (self.screen.ref, self.ref, "icon"))
+        self.screen.server.request(self.add_command())
         self.update()
         
     def update(self):
         
-        self.screen.server.request("widget_set %s %s %s %s %s" % (self.screen.ref, self.ref, self.x, self.y, self.name))
+        self.screen.server.request(self.set_command())
+
+    def set_command(self):
+
+        return "widget_set %s %s %s %s %s" % (self.screen.ref, self.ref, self.x, self.y, self.name)
 
     def set_x(self, x):
         
@@ -139,7 +180,9 @@ class IconWidget(object):
         
         self.name = name
         
-class ScrollerWidget(object):
+class ScrollerWidget(Widget):
+
+    type = "scroller"
     
     def __init__(self, screen, ref, left, top, right, bottom, direction, speed, text):
         self.screen = screen
@@ -152,13 +195,14 @@ class ScrollerWidget(object):
         self.speed = speed
         self.text = text
 
-        self.screen.server.request("widget_add %s %s %s" % (self.screen.ref, 
-                                                            self.ref, 
-                                                            "scroller"))
+        self.screen.server.request(self.add_command())
         self.update()
         
     def update(self):
-        self.screen.server.request('widget_set %s %s %s %s %s %s %s %s "%s"' % (self.screen.ref, 
+        self.screen.server.request(self.set_command())
+
+    def set_command(self):
+        return ('widget_set %s %s %s %s %s %s %s %s "%s"' % (self.screen.ref, 
                                                                   self.ref, 
                                                                   self.left, 
                                                                   self.top, 
@@ -190,7 +234,9 @@ class ScrollerWidget(object):
         self.text = text
         
         
-class FrameWidget(object):
+class FrameWidget(Widget):
+
+    type = "frame"
     
     def __init__(self, screen, ref, left, top, right, bottom, width, height, direction, speed):
         self.screen = screen
@@ -204,13 +250,14 @@ class FrameWidget(object):
         self.direction = direction
         self.speed = speed
 
-        self.screen.server.request("widget_add %s %s %s" % (self.screen.ref, 
-                                                            self.ref, 
-                                                            "frame"))
+        self.screen.server.request(self.add_command())
         self.update()
         
     def update(self):
-        self.screen.server.request('widget_set %s %s %s %s %s %s %s %s %s %s' % (self.screen.ref, 
+        self.screen.server.request(self.set_command())
+
+    def set_command(self):
+        return ('widget_set %s %s %s %s %s %s %s %s %s %s' % (self.screen.ref, 
                                                                   self.ref, 
                                                                   self.left, 
                                                                   self.top, 
@@ -246,7 +293,9 @@ class FrameWidget(object):
         self.speed = speed
                                           
                                           
-class NumberWidget(object):
+class NumberWidget(Widget):
+
+    type = "num"
     
     def __init__(self, screen, ref, x, value):
         self.screen = screen
@@ -254,16 +303,17 @@ class NumberWidget(object):
         self.x = x
         self.value = value
         
-        self.screen.server.request("widget_add %s %s %s" % (self.screen.ref, 
-                                                            self.ref, 
-                                                            "num"))
+        self.screen.server.request(self.add_command())
         self.update()
         
     def update(self):
-        self.screen.server.request('widget_set %s %s %s %s' % (self.screen.ref, 
-                                                               self.ref, 
-                                                               self.x,
-                                                               self.value))
+        self.screen.server.request(self.set_command())
+
+    def set_command(self):
+        return ('widget_set %s %s %s %s' % (self.screen.ref, 
+                                            self.ref, 
+                                            self.x,
+                                            self.value))
 
     def set_x(self, x):
         self.x = x
@@ -0,0 +1,65 @@
+# coding=utf-8
+from __future__ import absolute_import
+from collections import OrderedDict, namedtuple
+import threading
+
+# the part of OctoPrint's file metadata the plugin uses; time in seconds,
+# filament length in mm and volume in cm³ (all tools), dimensions in mm
+JobMetadata = namedtuple( 'JobMetadata', [ 'hash', 'estimated_time', 'filament_length', 'filament_volume', 'dimensions', ] )
+
+def job_metadata(metadata):
+    """ JobMetadata from a file manager metadata dict """
+    analysis = metadata.get("analysis") or {}
+
+    length = volume = None
+    for tool in ( analysis.get("filament") or {} ).values():
+        if not isinstance(tool, dict):
+            continue
+        if tool.get("length") is not None:
+            length = ( length or 0 ) + tool["length"]
+        if tool.get("volume") is not None:
+            volume = ( volume or 0 ) + tool["volume"]
+
+    dimensions = analysis.get("dimensions") or {}
+    if all(dimensions.get(axis) is not None for axis in ( "width", "depth", "height" )):
+        dimensions = ( dimensions["width"], dimensions["depth"], dimensions["height"] )
+    else:
+        dimensions = None
+
+    return JobMetadata(metadata.get("hash"), analysis.get("estimatedPrintTime"), length, volume, dimensions)
+
+class MetadataCache(object):
+
+    """
+    JobMetadata of recently used files, keyed by ( storage, path )
+
+    `load(storage, path)` returns the file manager's metadata dict, it is
+    only called on a miss, so printing the same file again costs no lookup.
+    Files which are changed, removed or (re)analysed have to be invalidated.
+    At most `size` entries are kept, the least recently used one is dropped
+    first.
+    """
+
+    def __init__(self, load, size=32):
+        self.load = load
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, storage, path):
+        key = ( storage, path )
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+
+        metadata = job_metadata(self.load(storage, path) or {})
+        with self.lock:
+            self.entries[key] = metadata
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        return metadata
+
+    def invalidate(self, storage, path):
+        with self.lock:
+            self.entries.pop(( storage, path ), None)
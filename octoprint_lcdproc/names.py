@@ -0,0 +1,42 @@
+# coding=utf-8
+from __future__ import absolute_import
+from functools import lru_cache
+import re
+
+FILENAME_EXTENSIONS = ( ".gcode", ".gco", ".g", ".bgcode", )
+
+# slicers append settings to the job name, e.g. PrusaSlicer's
+# "_0.2mm_PLA_MK3S_1h23m": everything from the layer height on is dropped.
+# Only a decimal layer height counts, "cube_20mm" is a part size, and a
+# trailing print time alone needs its hours, "cable_5m" is a length.
+SLICER_SUFFIX = re.compile(r"_\d+\.\d+mm(_.*)?$|_(\d+d)?\d+h(\d+m)?$", re.IGNORECASE)
+
+# marks the removed middle of an abbreviated name, the HD44780 character
+# ROM has no ellipsis
+ELLIPSIS = ".."
+
+def strip_filename(name):
+    """ Job name without extension and slicer suffixes """
+    for extension in FILENAME_EXTENSIONS:
+        if name.lower().endswith(extension):
+            name = name[:-len(extension)]
+            break
+    return SLICER_SUFFIX.sub("", name) or name
+
+@lru_cache(maxsize=16)
+def abbreviate_filename(name, width):
+    """
+    The job name fitting in width characters
+
+    The middle of a name too long is replaced by an ellipsis, the start and
+    the end usually tell most about a job. Cached, as names and widths only
+    change with the job or the layout.
+    """
+    name = strip_filename(name)
+    if width is None or len(name) <= width:
+        return name
+    if width <= len(ELLIPSIS):
+        return name[:width]
+    head = ( width - len(ELLIPSIS) + 1 ) // 2
+    tail = width - len(ELLIPSIS) - head
+    return name[:head] + ELLIPSIS + ( name[-tail:] if tail else "" )
@@ -0,0 +1,63 @@
+# coding=utf-8
+from __future__ import absolute_import
+from collections import namedtuple
+import threading
+
+NOTIFY_INFO = 0
+NOTIFY_MESSAGE = 1
+NOTIFY_ALERT = 2
+
+Notification = namedtuple( 'Notification', [ 'priority', 'sequence', 'text', 'expires', 'source', ] )
+
+class Notifications(object):
+
+    """
+    Short lived messages competing for the notification line
+
+    The message shown is the one with the highest priority, the most recent
+    one among equals. A message expires after its TTL (never without one).
+    Pushing a text which is already queued only renews it, pushing a message
+    with a source replaces the previous message of that source, and beyond
+    `size` messages the least important one is dropped, so a burst of events
+    never grows the queue. The queue is tiny, it is searched linearly; the
+    owner drives expiry with a timer set to next_expiry().
+    """
+
+    def __init__(self, size=8):
+        self.size = size
+        self.entries = list()
+        self.sequence = 0
+        self.lock = threading.Lock()
+
+    def push(self, text, priority, ttl, now, source=None):
+        with self.lock:
+            self.sequence += 1
+            self.entries = [ entry for entry in self.entries if entry.text != text and ( source is None or entry.source != source ) ]
+            self.entries.append(Notification(priority, self.sequence, text, now + ttl if ttl else None, source))
+            if len(self.entries) > self.size:
+                self.entries.remove(min(self.entries, key=self.rank))
+
+    def remove(self, source):
+        with self.lock:
+            self.entries = [ entry for entry in self.entries if entry.source != source ]
+
+    def clear(self):
+        with self.lock:
+            self.entries = list()
+
+    def expire(self, now):
+        with self.lock:
+            self.entries = [ entry for entry in self.entries if entry.expires is None or entry.expires > now ]
+
+    def current(self):
+        """ Text of the message to show, None if there is none """
+        with self.lock:
+            return max(self.entries, key=self.rank).text if self.entries else None
+
+    def next_expiry(self):
+        with self.lock:
+            expiries = [ entry.expires for entry in self.entries if entry.expires is not None ]
+        return min(expiries) if expiries else None
+
+    def rank(self, entry):
+        return ( entry.priority, entry.sequence )
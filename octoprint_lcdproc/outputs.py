@@ -0,0 +1,76 @@
+# coding=utf-8
+from __future__ import absolute_import
+import threading
+
+OUTPUT_PRINTING = "printing"
+OUTPUT_PAUSED = "paused"
+OUTPUT_ERROR = "error"
+OUTPUT_DONE = "done"
+OUTPUT_HEATING = "heating"
+
+OUTPUT_STATES = [ OUTPUT_PRINTING, OUTPUT_PAUSED, OUTPUT_ERROR, OUTPUT_DONE, OUTPUT_HEATING, ]
+
+class Outputs(object):
+
+    """
+    Printer state to LCDd general purpose output mapping
+
+    Every active state contributes its bit pattern to the output value. State
+    changes only mark the value dirty and ask `wake(delay)` for a flush()
+    call `interval` seconds later, so a burst of changes results in a single
+    `output` command, and nothing is sent when the value ends up unchanged.
+    """
+
+    def __init__(self, write, wake, interval=0.1):
+        self.write = write
+        self.wake = wake
+        self.interval = interval
+        self.bits = dict()
+        self.active = set()
+        self.written = None
+        self.pending = False
+        self.lock = threading.Lock()
+
+    def set_bits(self, state, bits):
+        with self.lock:
+            self.bits[state] = bits
+        self.schedule()
+
+    def set(self, state, active=True):
+        with self.lock:
+            if active == ( state in self.active ):
+                return
+            if active:
+                self.active.add(state)
+            else:
+                self.active.discard(state)
+        self.schedule()
+
+    def reset(self):
+        """ Forget the last written value, e.g. after a reconnect """
+        with self.lock:
+            self.written = None
+        self.schedule()
+
+    def value(self):
+        value = 0
+        for state in self.active:
+            value |= self.bits.get(state, 0)
+        return value
+
+    def schedule(self):
+        with self.lock:
+            if self.pending:
+                return
+            self.pending = True
+        self.wake(self.interval)
+
+    def flush(self):
+        with self.lock:
+            self.pending = False
+            value = self.value()
+            if value == self.written:
+                return
+        if self.write(value):
+            with self.lock:
+                self.written = value
@@ -0,0 +1,164 @@
+# coding=utf-8
+from __future__ import absolute_import
+import threading
+import time
+
+class Timer(object):
+
+    """ A scheduled call, owned by the Scheduler which created it """
+
+    __slots__ = ( "due", "sequence", "function", "args", "index" )
+
+    def __init__(self, function, args):
+        self.due = None
+        self.sequence = 0
+        self.function = function
+        self.args = args
+        self.index = -1
+
+    def queued(self):
+        return self.index >= 0
+
+class Scheduler(object):
+
+    """
+    All delayed and periodic work of the plugin on one thread
+
+    Timers live in a binary heap ordered by due time. Each timer knows its
+    position in the heap, so cancelling or rescheduling is O(log n), and
+    pending() is exact. Callbacks run on the scheduler thread and have to be
+    short: they are expected to record state and wake the display worker.
+    Periodic work reschedules its timer from the callback. `wakeups` counts
+    how often the thread woke up, an empty scheduler never wakes.
+    """
+
+    def __init__(self, logger, name="LCDproc scheduler"):
+        self.name = name
+        self.heap = list()
+        self.sequence = 0
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.wakeups = 0
+        self._logger = logger
+
+    def start(self):
+        with self.condition:
+            if self.running:
+                return
+            self.running = True
+        self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+
+    def timer(self, function, *args):
+        """ Creates a timer calling function(*args), not queued yet """
+        return Timer(function, args)
+
+    def schedule(self, delay, function, *args):
+        """ Creates a timer calling function(*args) after delay seconds """
+        timer = Timer(function, args)
+        self.reschedule(timer, delay)
+        return timer
+
+    def reschedule(self, timer, delay, earlier_only=False):
+        """
+        (Re)queues the timer to fire after delay seconds
+
+        With earlier_only a queued timer is only moved forward, never back.
+        """
+        due = time.monotonic() + delay
+        with self.condition:
+            if timer.queued():
+                if earlier_only and timer.due <= due:
+                    return
+                self._remove(timer.index)
+            self.sequence += 1
+            timer.due = due
+            timer.sequence = self.sequence
+            self._push(timer)
+            if timer.index == 0:
+                self.condition.notify()
+
+    def cancel(self, timer):
+        with self.condition:
+            if timer is not None and timer.queued():
+                self._remove(timer.index)
+
+    def pending(self):
+        with self.condition:
+            return len(self.heap)
+
+    def run(self):
+        while True:
+            with self.condition:
+                timer = None
+                while self.running:
+                    if self.heap:
+                        wait = self.heap[0].due - time.monotonic()
+                        if wait <= 0:
+                            timer = self.heap[0]
+                            self._remove(0)
+                            break
+                    else:
+                        wait = None
+                    self.condition.wait(wait)
+                    self.wakeups += 1
+                if not self.running:
+                    return
+            try:
+                timer.function(*timer.args)
+            except:
+                self._logger.exception("Scheduled call of %r failed" % timer.function)
+
+    ##~~ heap helpers, called with the condition held
+
+    def _less(self, a, b):
+        return ( a.due, a.sequence ) < ( b.due, b.sequence )
+
+    def _place(self, timer, index):
+        self.heap[index] = timer
+        timer.index = index
+
+    def _push(self, timer):
+        self.heap.append(timer)
+        timer.index = len(self.heap) - 1
+        self._sift_up(timer.index)
+
+    def _remove(self, index):
+        removed = self.heap[index]
+        last = self.heap.pop()
+        if index < len(self.heap):
+            self._place(last, index)
+            self._sift_up(index)
+            self._sift_down(last.index)
+        removed.index = -1
+
+    def _sift_up(self, index):
+        timer = self.heap[index]
+        while index > 0:
+            parent = ( index - 1 ) // 2
+            if not self._less(timer, self.heap[parent]):
+                break
+            self._place(self.heap[parent], index)
+            index = parent
+        self._place(timer, index)
+
+    def _sift_down(self, index):
+        timer = self.heap[index]
+        size = len(self.heap)
+        while True:
+            child = 2 * index + 1
+            if child >= size:
+                break
+            if child + 1 < size and self._less(self.heap[child + 1], self.heap[child]):
+                child += 1
+            if not self._less(self.heap[child], timer):
+                break
+            self._place(self.heap[child], index)
+            index = child
+        self._place(timer, index)
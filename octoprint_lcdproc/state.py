@@ -0,0 +1,45 @@
+# coding=utf-8
+from __future__ import absolute_import
+from collections import namedtuple
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from octoprint_lcdproc.metadata import JobMetadata
+
+STATE_NON_PRINTING = "non_printing"
+STATE_PRINTING = "printing"
+STATE_IDLE = "idle"
+STATE_PAUSED = "paused"
+STATE_ERROR = "error"
+
+# what the result screen shows about the last finished print
+PrintResult = namedtuple( 'PrintResult', [ 'text', 'duration', 'finished', ] )
+
+@dataclass(frozen=True)
+class DisplayState(object):
+
+    """
+    Everything the screens show, as one immutable snapshot
+
+    Producers build a new snapshot with dataclasses.replace() and swap the
+    reference, renderers take the reference once per frame, so they never see
+    a half updated state.
+    """
+
+    priority_state: str = STATE_IDLE
+    # a firmware alert is shown on top of whatever the printer is doing
+    alert: bool = False
+    status: Optional[str] = None
+    filename: Optional[str] = None
+    percent: Optional[int] = None
+    eta: Optional[int] = None
+    started: Optional[datetime] = None
+    message: Optional[str] = None
+    layer: Optional[int] = None
+    layers: Optional[int] = None
+    filament: Optional[float] = None
+    filament_total: Optional[float] = None
+    metadata: Optional[JobMetadata] = None
+    result: Optional[PrintResult] = None
+    result_priority: str = "hidden"
@@ -0,0 +1,148 @@
+# coding=utf-8
+from __future__ import absolute_import
+from collections import OrderedDict, namedtuple
+import os
+import threading
+
+# layers and filament (mm) of a whole job
+JobTotals = namedtuple( 'JobTotals', [ 'layers', 'filament', ] )
+
+def parameter(cmd, letter):
+    """ Value of a parameter of a gcode command, None if missing or invalid """
+    start = cmd.find(letter, 1)
+    if start < 0:
+        return None
+    end = cmd.find(" ", start)
+    try:
+        return float(cmd[start + 1:end] if end >= 0 else cmd[start + 1:])
+    except ValueError:
+        return None
+
+class GcodeTracker(object):
+
+    """
+    Layer and filament counter fed with gcode commands one by one
+
+    OctoPrint strips comments before a line is sent, so layers are counted
+    from the moves: a layer starts with the first extrusion above the height
+    of the previous one, travel moves and z hops do not count. The filament
+    is the sum of all E deltas, retractions included. Every command costs a
+    few string searches, there is no regex and no per-line allocation beyond
+    the parsed numbers.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.relative = False
+        self.relative_e = False
+        self.z = 0.0
+        self.e = 0.0
+        self.layer_z = None
+        self.layer = 0
+        self.filament = 0.0
+
+    def commands(self):
+        """ gcode -> handler taking the command line """
+        return {
+            "G0": self.move,
+            "G1": self.move,
+            "G90": self.absolute,
+            "G91": self.relative_moves,
+            "G92": self.set_position,
+            "M82": self.absolute_extrusion,
+            "M83": self.relative_extrusion,
+        }
+
+    def move(self, cmd):
+        """ Returns True if the move started a new layer """
+        z = parameter(cmd, "Z")
+        if z is not None:
+            self.z = self.z + z if self.relative else z
+
+        e = parameter(cmd, "E")
+        if e is None:
+            return False
+        delta = e if self.relative_e else e - self.e
+        self.e += delta
+        self.filament += delta
+
+        if delta > 0 and ( self.layer_z is None or self.z > self.layer_z ):
+            self.layer_z = self.z
+            self.layer += 1
+            return True
+        return False
+
+    def absolute(self, cmd):
+        self.relative = False
+        self.relative_e = False
+
+    def relative_moves(self, cmd):
+        self.relative = True
+        self.relative_e = True
+
+    def absolute_extrusion(self, cmd):
+        self.relative_e = False
+
+    def relative_extrusion(self, cmd):
+        self.relative_e = True
+
+    def set_position(self, cmd):
+        e = parameter(cmd, "E")
+        if e is not None:
+            self.e = e
+        z = parameter(cmd, "Z")
+        if z is not None:
+            self.z = z
+
+def scan_file(path):
+    """ Runs a gcode file through a GcodeTracker, returns its JobTotals """
+    tracker = GcodeTracker()
+    commands = tracker.commands()
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.split(";", 1)[0].strip().upper()
+            if not line:
+                continue
+            words = line.split(None, 2)
+            code = words[0]
+            if code[0] == "N" and len(words) > 1:
+                # line number
+                code = words[1]
+            if code[1:].isdigit():
+                code = code[0] + str(int(code[1:]))
+            handler = commands.get(code)
+            if handler is not None:
+                handler(line)
+    return JobTotals(tracker.layer, tracker.filament)
+
+class JobTotalsCache(object):
+
+    """
+    JobTotals of recently printed files
+
+    A file is scanned on first use only, entries are keyed by path, size and
+    modification time, so a re-uploaded file is scanned again. At most `size`
+    entries are kept, the least recently used one is dropped first.
+    """
+
+    def __init__(self, size=8):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        stat = os.stat(path)
+        key = ( path, stat.st_size, stat.st_mtime )
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+
+        totals = scan_file(path)
+        with self.lock:
+            self.entries[key] = totals
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        return totals
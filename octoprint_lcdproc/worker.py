@@ -0,0 +1,86 @@
+# coding=utf-8
+from __future__ import absolute_import
+import threading
+import time
+
+class DisplayWorker(object):
+
+    """
+    The only thread talking to LCDd
+
+    Producers call mark() with the name of what needs to be redrawn or
+    flushed (delayed marks come from the scheduler). Marks are kept in a set,
+    so marking an item again before it is rendered costs nothing: the renderer
+    reads the latest state when it gets to it. Consecutive frames are at least
+    `1 / fps` seconds apart, the first frame after a quiet period is rendered
+    immediately. `wakeups` counts how often the thread woke up. A second
+    instance scans job files, so that a scan never holds up a frame.
+    """
+
+    def __init__(self, render, logger, fps=10.0, name="LCDd worker"):
+        self.render = render
+        self.frame_interval = 1.0 / fps
+        self.name = name
+        self.dirty = set()
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.last_frame = 0
+        self.wakeups = 0
+        self._logger = logger
+
+    def start(self):
+        with self.condition:
+            if self.running:
+                return
+            self.running = True
+        self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+
+    def mark(self, item):
+        with self.condition:
+            if item in self.dirty:
+                return
+            self.dirty.add(item)
+            self.condition.notify()
+
+    def hurry(self):
+        """ Renders the next frame right away, without waiting for the frame interval """
+        with self.condition:
+            self.last_frame = 0
+            self.condition.notify()
+
+    def pending(self):
+        with self.condition:
+            return len(self.dirty)
+
+    def next_frame(self):
+        """ Waits for the next frame, returns the set of items to render or None when stopped """
+        with self.condition:
+            while self.running:
+                now = time.monotonic()
+                wait = None
+                if self.dirty:
+                    wait = self.last_frame + self.frame_interval - now
+                    if wait <= 0:
+                        items, self.dirty = self.dirty, set()
+                        self.last_frame = now
+                        return items
+                self.condition.wait(wait)
+                self.wakeups += 1
+            return None
+
+    def run(self):
+        while True:
+            items = self.next_frame()
+            if items is None:
+                return
+            try:
+                self.render(items)
+            except:
+                self._logger.exception("Rendering %s failed" % ", ".join(sorted(items)))
@@ -0,0 +1,180 @@
+# coding=utf-8
+from __future__ import absolute_import
+import logging
+import socket
+import threading
+import time
+
+import pytest
+
+HELLO_REPLY = "connect LCDproc 0.5.9 protocol 0.3 lcd wid %d hgt %d cellwid 5 cellhgt 8\n"
+
+class FakeLCDd(object):
+
+    """
+    Minimal LCDd on a local port
+
+    Answers `hello` with a width x height display, `noop` with `noop complete` and
+    every other command with `success`, each reply after `stall` seconds.
+    Received commands are kept in `lines`, send() pushes data (e.g. key
+    events) to every client.
+    """
+
+    def __init__(self, stall=0.0, port=0, width=20, height=4):
+        self.stall = stall
+        self.hello = (HELLO_REPLY % ( width, height )).encode()
+        self.lines = list()
+        self.connections = list()
+        self.server = socket.socket()
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(("127.0.0.1", port))
+        self.server.listen(5)
+        self.port = self.server.getsockname()[1]
+        self.running = True
+        threading.Thread(target=self.accept, daemon=True).start()
+
+    def accept(self):
+        while self.running:
+            try:
+                connection, address = self.server.accept()
+            except OSError:
+                return
+            self.connections.append(connection)
+            threading.Thread(target=self.serve, args=(connection,), daemon=True).start()
+
+    def serve(self, connection):
+        try:
+            for line in connection.makefile("rb"):
+                line = line.decode().strip()
+                self.lines.append(line)
+                if self.stall:
+                    threading.Event().wait(self.stall)
+                if line == "hello":
+                    connection.sendall(self.hello)
+                elif line == "noop":
+                    connection.sendall(b"noop complete\n")
+                else:
+                    connection.sendall(b"success\n")
+        except OSError:
+            pass
+
+    def send(self, data):
+        for connection in list(self.connections):
+            connection.sendall(data)
+
+    def close(self):
+        """ LCDd goes away: the clients are dropped and the port is closed """
+        self.running = False
+        for connection in self.connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            connection.close()
+        # a blocked accept() keeps the port listening until it is shut down
+        try:
+            self.server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.server.close()
+
+class FakeSettings(object):
+
+    """ The part of OctoPrint's plugin settings the plugin uses """
+
+    def __init__(self, values):
+        self.values = values
+
+    def get(self, path):
+        return self.values[path[0]]
+
+    def get_boolean(self, path):
+        return bool(self.values[path[0]])
+
+    def get_int(self, path):
+        return int(self.values[path[0]])
+
+class FakePrinter(object):
+
+    def register_callback(self, callback):
+        pass
+
+    def unregister_callback(self, callback):
+        pass
+
+    def is_printing(self):
+        return False
+
+    def is_paused(self):
+        return False
+
+class FakeFileManager(object):
+
+    def get_metadata(self, origin, path):
+        return {}
+
+    def path_on_disk(self, origin, path):
+        raise IOError("no such file")
+
+@pytest.fixture
+def lcdd():
+    server = FakeLCDd()
+    yield server
+    server.close()
+
+@pytest.fixture
+def stalled_lcdd():
+    # every reply takes longer than a test may wait for a callback
+    server = FakeLCDd(stall=2.0)
+    yield server
+    server.close()
+
+@pytest.fixture
+def silent_listener():
+    """ A local port which accepts connections into its backlog, but never answers """
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(0)
+    yield listener.getsockname()[1]
+    listener.close()
+
+@pytest.fixture
+def make_plugin(tmp_path):
+    """ Creates and starts an LcdprocPlugin, with settings overrides, like OctoPrint would """
+    from octoprint_lcdproc import LcdprocPlugin, LCDD_TIMEOUT
+
+    plugins = list()
+
+    def make(start=True, **settings):
+        plugin = LcdprocPlugin()
+        values = plugin.get_settings_defaults()
+        values.update(settings)
+        plugin._settings = FakeSettings(values)
+        plugin._logger = logging.getLogger("octoprint.plugins.lcdproc")
+        plugin._printer = FakePrinter()
+        plugin._file_manager = FakeFileManager()
+        plugin.get_plugin_data_folder = lambda: str(tmp_path)
+        plugins.append(plugin)
+        if start:
+            plugin.on_startup("127.0.0.1", 5000)
+        return plugin
+
+    yield make
+
+    for plugin in plugins:
+        plugin.on_shutdown()
+        if plugin.worker and plugin.worker.thread:
+            # the session belongs to the worker until it is done
+            plugin.worker.thread.join(LCDD_TIMEOUT + 1)
+        if plugin.lcd:
+            plugin.lcd.close_session()
+
+@pytest.fixture
+def wait_for():
+    """ Polls condition() until it is true or timeout seconds passed, returns its last value """
+    def wait(condition, timeout=3.0):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return condition()
+    return wait
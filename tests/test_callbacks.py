@@ -0,0 +1,45 @@
+# coding=utf-8
+from __future__ import absolute_import
+import time
+
+import pytest
+
+pytest.importorskip("octoprint")
+
+# OctoPrint's callback threads may not wait on LCDd: a callback only records
+# the new state and marks what has to be redrawn
+CALLBACK_SECONDS = 0.001
+
+def average_seconds(callback, calls=200):
+    start = time.perf_counter()
+    for index in range(calls):
+        callback(index)
+    return (time.perf_counter() - start) / calls
+
+@pytest.fixture
+def stalled_plugin(make_plugin, stalled_lcdd, wait_for):
+    plugin = make_plugin(port=stalled_lcdd.port)
+    # the worker is stuck waiting for the reply to hello
+    assert wait_for(lambda: "hello" in stalled_lcdd.lines)
+    return plugin
+
+def test_progress_returns_while_lcdd_stalls(stalled_plugin):
+    assert average_seconds(lambda index: stalled_plugin.on_print_progress("local", "cube.gcode", index % 100)) < CALLBACK_SECONDS
+    assert stalled_plugin.state.percent == 99
+
+def test_events_return_while_lcdd_stalls(stalled_plugin):
+    payload = { "name": "cube.gcode", "path": "cube.gcode", "origin": "local" }
+    events = [ "PrintStarted", "PrintPaused", "PrintResumed" ]
+    assert average_seconds(lambda index: stalled_plugin.on_event(events[index % len(events)], payload)) < CALLBACK_SECONDS
+    assert stalled_plugin.state.priority_state == "paused"
+
+def test_gcode_hooks_return_while_lcdd_stalls(stalled_plugin):
+    assert average_seconds(lambda index: stalled_plugin.on_gcode_sent(None, "sent", "M117 Layer %d" % index, None, "M117")) < CALLBACK_SECONDS
+    assert average_seconds(lambda index: stalled_plugin.on_gcode_received(None, "ok T:%d.0 /210.0\n" % index)) < CALLBACK_SECONDS
+    assert stalled_plugin.state.message == "Layer 199"
+
+def test_current_data_returns_while_lcdd_stalls(stalled_plugin):
+    stalled_plugin.on_event("PrintStarted", { "name": "cube.gcode", "path": "cube.gcode", "origin": "local" })
+    data = lambda index: { "progress": { "completion": index % 100, "printTimeLeft": 600 - index }, "job": {} }
+    assert average_seconds(lambda index: stalled_plugin.on_current_data(data(index))) < CALLBACK_SECONDS
+    assert stalled_plugin.state.percent == 99
@@ -0,0 +1,30 @@
+# coding=utf-8
+from __future__ import absolute_import
+import os
+
+import pytest
+
+pytest.importorskip("octoprint")
+
+from octoprint_lcdproc.estimator import DurationStore, EtaEstimator
+
+def test_pauses_do_not_count(tmp_path):
+    estimator = EtaEstimator(DurationStore(str(tmp_path / "durations.json")))
+    estimator.start(None, 0)
+    estimator.pause(600)
+    # an hour paused at 25%: the rate is that of the 600 s printed
+    assert estimator.update(4200, 25, None) == 1800
+    estimator.resume(4200)
+    assert estimator.elapsed(4800) == 1200
+    assert estimator.update(4800, 50, None) == 1200
+
+def test_unwritable_store_does_not_break_the_print_end(make_plugin, lcdd):
+    plugin = make_plugin(port=lcdd.port, eta_estimator_enabled=True)
+    payload = { "name": "cube.gcode", "path": "cube.gcode", "origin": "local", "time": 60 }
+    plugin.on_event("PrintStarted", payload)
+    plugin.print_key = "cube"
+    # the store cannot be written
+    os.mkdir(plugin.estimator.store.path + ".tmp")
+    plugin.on_event("PrintDone", payload)
+    assert plugin.state.result.text == "DONE"
+    assert plugin.timer_screen.queued()
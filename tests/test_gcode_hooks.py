@@ -0,0 +1,48 @@
+# coding=utf-8
+from __future__ import absolute_import
+import itertools
+import time
+
+import pytest
+
+pytest.importorskip("octoprint")
+
+STREAM_LINES = 2000000
+
+# per line bounds with ample headroom for slow machines; a line nobody
+# handles costs one dict lookup, a print adds move tracking, M73 and M117
+IGNORED_LINE_SECONDS = 0.000005
+PRINT_LINE_SECONDS = 0.000020
+
+def layer(z):
+    """ One layer of a sliced job, as sent to the printer """
+    lines = [ "G1 Z%.2f F720" % z, "M117 Layer at %.2f" % z, "M73 P%d R%d" % ( z * 10, 60 - z * 10 ) ]
+    for index in range(200):
+        lines.append("G1 X%.3f Y%.3f E%.5f" % ( 100 + index % 50, 100 + index // 50, 0.05 * index ))
+        if index % 20 == 0:
+            lines.extend([ "M106 S255", "M204 S1000", "G92 E0", ])
+    return lines
+
+def gcode(line):
+    return line.split(" ", 1)[0]
+
+def sent_per_line(plugin, lines):
+    """ Average seconds per line of the sent hook, over STREAM_LINES lines cycled from lines """
+    stream = [ ( line, gcode(line) ) for line in lines ]
+    hook = plugin.on_gcode_sent
+    start = time.perf_counter()
+    for cmd, code in itertools.islice(itertools.cycle(stream), STREAM_LINES):
+        hook(None, "sent", cmd, None, code)
+    return (time.perf_counter() - start) / STREAM_LINES
+
+def test_ignored_lines_cost_one_lookup(make_plugin, lcdd):
+    plugin = make_plugin(port=lcdd.port)
+    lines = [ "M104 S210", "M106 S255", "M204 S1000", "G4 P0", "M400", "M105", "T0", "M114", ]
+    assert sent_per_line(plugin, lines) < IGNORED_LINE_SECONDS
+
+def test_print_stream(make_plugin, lcdd):
+    plugin = make_plugin(port=lcdd.port)
+    plugin.on_event("PrintStarted", { "name": "cube.gcode", "path": "cube.gcode", "origin": "local" })
+    lines = list(itertools.chain.from_iterable(layer(0.2 * index) for index in range(1, 21)))
+    assert sent_per_line(plugin, lines) < PRINT_LINE_SECONDS
+    assert plugin.state.message.startswith("Layer at ")
@@ -0,0 +1,70 @@
+# coding=utf-8
+from __future__ import absolute_import
+import time
+
+import pytest
+
+pytest.importorskip("octoprint")
+
+@pytest.fixture
+def idle_plugin(make_plugin, lcdd, wait_for):
+    """ A plugin which printed once and went idle """
+    plugin = make_plugin(port=lcdd.port, notification_ttl_seconds=1, backlight_enabled=True, backlight_key_seconds=1, outputs_enabled=True, keys_enabled=True)
+    assert wait_for(lambda: plugin.lcd and plugin.lcd.alive_session())
+
+    payload = { "name": "cube.gcode", "path": "cube.gcode", "origin": "local", "time": 60 }
+    plugin.on_event("PrintStarted", payload)
+    plugin.on_print_progress("local", "cube.gcode", 50)
+    plugin.on_event("PrintDone", payload)
+    # the idle timer goes off now instead of after idle_time_minutes
+    plugin.scheduler.reschedule(plugin.timer_screen, 0)
+    assert wait_for(lambda: plugin.idle_mode)
+    assert_quiet(plugin, lcdd, wait_for)
+    return plugin
+
+def assert_quiet(plugin, lcdd, wait_for):
+    # pending one-shot flushes (frames, notification expiry) still run, then
+    # nothing is queued: both threads wait without a timeout, so an idle hour
+    # is as quiet as the half second watched below
+    assert wait_for(lambda: plugin.scheduler.pending() == 0 and plugin.worker.pending() == 0)
+
+    scheduler_wakeups = plugin.scheduler.wakeups
+    worker_wakeups = plugin.worker.wakeups
+    sent = len(lcdd.lines)
+    time.sleep(0.5)
+    assert plugin.scheduler.wakeups == scheduler_wakeups
+    assert plugin.worker.wakeups == worker_wakeups
+    assert len(lcdd.lines) == sent
+
+def test_idle_mode_has_no_wakeups(idle_plugin, lcdd, wait_for):
+    assert idle_plugin.idle_mode
+
+def test_events_keep_idle_mode(idle_plugin, lcdd, wait_for):
+    # events which leave the display idle are handled without ending it
+    idle_plugin.on_event("Upload", { "name": "benchy.gcode", "path": "benchy.gcode", "target": "local" })
+    idle_plugin.on_event("FileAdded", { "name": "benchy.gcode", "path": "benchy.gcode", "storage": "local" })
+    idle_plugin.on_event("Connected", { "port": "/dev/ttyACM0", "baudrate": 115200 })
+    assert idle_plugin.idle_mode
+    assert idle_plugin.state.message == "Uploaded benchy"
+    assert_quiet(idle_plugin, lcdd, wait_for)
+
+    # so are key presses on the hidden page
+    lcdd.send(b"key Down\n")
+    assert wait_for(lambda: idle_plugin.backlight.key_until > 0)
+    assert idle_plugin.idle_mode
+    assert_quiet(idle_plugin, lcdd, wait_for)
+
+def test_events_keep_idle_mode_while_lcdd_is_down(idle_plugin, lcdd, wait_for):
+    lcdd.close()
+    idle_plugin.lcd.noop()
+    assert not idle_plugin.lcd.alive_session()
+
+    # the event tries to connect, failures are not retried with backoff
+    idle_plugin.on_event("Upload", { "name": "benchy.gcode", "path": "benchy.gcode", "target": "local" })
+    assert idle_plugin.idle_mode
+    assert wait_for(lambda: idle_plugin.connection.failures > 0)
+    assert_quiet(idle_plugin, lcdd, wait_for)
+
+def test_print_ends_idle_mode(idle_plugin):
+    idle_plugin.on_event("PrintStarted", { "name": "benchy.gcode", "path": "benchy.gcode", "origin": "local" })
+    assert not idle_plugin.idle_mode
@@ -0,0 +1,25 @@
+# coding=utf-8
+from __future__ import absolute_import
+import threading
+
+import pytest
+
+pytest.importorskip("octoprint")
+
+def write_job(path, layers):
+    with open(path, "w") as f:
+        for layer in range(1, layers + 1):
+            f.write("G1 Z%.1f\nG1 X10 Y10 E%d\n" % ( 0.2 * layer, layer ))
+    return str(path)
+
+def test_latest_print_keeps_its_totals(make_plugin, lcdd, wait_for, tmp_path):
+    plugin = make_plugin(port=lcdd.port)
+    jobs = { "big.gcode": write_job(tmp_path / "big.gcode", 20000), "small.gcode": write_job(tmp_path / "small.gcode", 5) }
+    plugin._file_manager.path_on_disk = lambda origin, path: jobs[path]
+
+    # the second print starts while the first file is still scanned
+    for name in [ "big.gcode", "small.gcode" ]:
+        plugin.on_event("PrintStarted", { "name": name, "path": name, "origin": "local" })
+    assert wait_for(lambda: plugin.state.layers is not None and plugin.job_scanner.pending() == 0)
+    assert plugin.state.layers == 5
+    assert len([ thread for thread in threading.enumerate() if thread.name == "LCDproc job scan" ]) == 1
@@ -0,0 +1,39 @@
+# coding=utf-8
+from __future__ import absolute_import
+import time
+
+import pytest
+
+pytest.importorskip("octoprint")
+
+KEY_LATENCY_SECONDS = 0.050
+
+def key_latency(lcdd, key, done, timeout=1.0):
+    """ Seconds from LCDd sending the key event to done() becoming true """
+    start = time.perf_counter()
+    lcdd.send(("key %s\n" % key).encode())
+    while not done():
+        assert time.perf_counter() - start < timeout
+        time.sleep(0.0005)
+    return time.perf_counter() - start
+
+def test_key_to_action_latency(make_plugin, lcdd, wait_for):
+    # the pages are shown between prints too
+    plugin = make_plugin(port=lcdd.port, keys_enabled=True, hide_page_when_idle=False)
+    # the layout is complete
+    assert wait_for(lambda: plugin.keypad is not None and plugin.worker.pending() == 0)
+
+    # alternating keys, so that no press is taken for an auto-repeat
+    latencies = list()
+    for index in range(10):
+        page = plugin.selected_page
+        key = "Down" if index % 2 == 0 else "Up"
+        latencies.append(key_latency(lcdd, key, lambda: plugin.selected_page != page))
+    assert max(latencies) < KEY_LATENCY_SECONDS
+
+    # the selected page reaches LCDd with the next frame
+    page = plugin.selected_page
+    sent = len(lcdd.lines)
+    key_latency(lcdd, "Down", lambda: plugin.selected_page != page)
+    shown = "screen_set %s priority info" % plugin.selected_page
+    assert wait_for(lambda: shown in lcdd.lines[sent:])
@@ -0,0 +1,45 @@
+# coding=utf-8
+from __future__ import absolute_import
+import pytest
+
+pytest.importorskip("octoprint")
+
+from conftest import FakeLCDd
+
+@pytest.fixture
+def small_lcdd():
+    server = FakeLCDd(width=24, height=2)
+    yield server
+    server.close()
+
+def test_message_line_below_the_file_name(make_plugin, lcdd, wait_for):
+    plugin = make_plugin(port=lcdd.port)
+    assert wait_for(lambda: plugin.lcd and plugin.lcd.alive_session())
+    plugin.on_gcode_sent(None, "sent", "M117 Heating", None, "M117")
+    assert wait_for(lambda: 'widget_set OctPriSCR1 TextMessage 1 3 20 3 h 5 "Heating"' in lcdd.lines)
+
+def test_message_over_the_file_name_on_two_lines(make_plugin, small_lcdd, wait_for):
+    plugin = make_plugin(port=small_lcdd.port, notifications_enabled=False)
+    assert wait_for(lambda: plugin.lcd and plugin.lcd.alive_session())
+    plugin.on_event("PrintStarted", { "name": "cube.gcode", "path": "cube.gcode", "origin": "local" })
+    plugin.on_gcode_sent(None, "sent", "M117 Heating", None, "M117")
+    # on the file name's line, the percentage stays visible
+    assert wait_for(lambda: 'widget_set OctPriSCR1 TextMessage 1 1 19 1 h 5 "Heating"' in small_lcdd.lines)
+    assert 'widget_set OctPriSCR1 TextFileName 1 1 19 1 h 5 ""' in small_lcdd.lines
+
+    # the file name comes back with the end of the message
+    sent = len(small_lcdd.lines)
+    plugin.on_gcode_sent(None, "sent", "M117", None, "M117")
+    assert wait_for(lambda: 'widget_set OctPriSCR1 TextFileName 1 1 19 1 h 5 "cube"' in small_lcdd.lines[sent:])
+
+def test_result_on_two_lines(make_plugin, small_lcdd, wait_for):
+    plugin = make_plugin(port=small_lcdd.port)
+    assert wait_for(lambda: plugin.lcd and plugin.lcd.alive_session())
+    payload = { "name": "cube.gcode", "path": "cube.gcode", "origin": "local", "time": 3725 }
+    plugin.on_event("PrintStarted", payload)
+    plugin.on_event("PrintDone", payload)
+    finished = plugin.state.result.finished
+    # duration and end time share the line below the title
+    shown = 'widget_set OctPriRES TextResultTime 1 2 "1:02:05 @%02d:%02d"' % ( finished.hour, finished.minute )
+    assert wait_for(lambda: shown in small_lcdd.lines)
+    assert not [ line for line in small_lcdd.lines if "TextResultEnd" in line ]
@@ -0,0 +1,24 @@
+# coding=utf-8
+from __future__ import absolute_import
+import pytest
+
+pytest.importorskip("octoprint")
+
+from conftest import FakeLCDd
+
+def test_lost_connection_is_noticed_right_away(make_plugin, lcdd, wait_for):
+    plugin = make_plugin(port=lcdd.port)
+    assert wait_for(lambda: plugin.lcd and plugin.lcd.alive_session())
+
+    # LCDd restarts: no request is pending, the health check is off
+    port = lcdd.port
+    lcdd.close()
+    assert wait_for(lambda: not plugin.lcd.alive_session(), timeout=0.5)
+
+    restarted = FakeLCDd(port=port)
+    try:
+        # the layout of the lost session is restored
+        assert wait_for(lambda: plugin.lcd.alive_session())
+        assert "screen_add OctPriSCR1" in restarted.lines
+    finally:
+        restarted.close()
@@ -0,0 +1,25 @@
+# coding=utf-8
+from __future__ import absolute_import
+import time
+
+import pytest
+
+pytest.importorskip("octoprint")
+
+from octoprint_lcdproc import LCDD_TIMEOUT
+
+# OctoPrint's startup may not wait for LCDd, whatever state it is in
+STARTUP_SECONDS = 0.1
+
+def test_startup_does_not_wait_for_lcdd(make_plugin, silent_listener, wait_for):
+    start = time.perf_counter()
+    plugin = make_plugin(port=silent_listener)
+    elapsed = time.perf_counter() - start
+    assert elapsed < STARTUP_SECONDS < LCDD_TIMEOUT
+
+    # the worker waits for the reply to hello meanwhile, the latest state is
+    # kept until the session is up
+    assert wait_for(lambda: plugin.lcd is not None)
+    assert not plugin.lcd.alive_session()
+    plugin.on_print_progress("local", "cube.gcode", 42)
+    assert plugin.state.percent == 42